@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points whose import cost short-lived workers and CLI runs pay
+DEFAULT_MODULES = ["src.config", "src.nhl_scraper", "src.run_tableau_data_export"]
+
+# Heavy dependencies that should only load when they're first used
+LAZY_MODULES = ["nhlpy", "httpx", "joblib", "sklearn", "xgboost", "dotenv"]
+
+_PROBE = """
+import sys, json
+import {module}
+print(json.dumps([name for name in {lazy!r} if name in sys.modules]))
+"""
+
+
+def import_once(module: str, data_dir: str) -> tuple:
+    # Import module in a fresh interpreter. Returns its cumulative import
+    # time in ms (from -X importtime) and the lazy modules it pulled in.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=PACKAGE_DIR,
+        env={**os.environ, "NHL_DATA_DIR": data_dir},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    micros = None
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            micros = int(fields[1])
+    return micros / 1000, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(modules: list, runs: int) -> dict:
+    # Median import time per module over runs fresh interpreters, plus any
+    # lazy modules loaded and whether importing created the data directory
+    results = {}
+    for module in modules:
+        data_dir = os.path.join(tempfile.mkdtemp(prefix="nhl_import_"), "data")
+        times = []
+        loaded = set()
+        for _ in range(runs):
+            ms, lazy_loaded = import_once(module, data_dir)
+            times.append(ms)
+            loaded.update(lazy_loaded)
+        results[module] = {
+            "median_ms": statistics.median(times),
+            "min_ms": min(times),
+            "lazy_loaded": sorted(loaded),
+            "created_dirs": os.path.exists(data_dir),
+        }
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long importing the pipeline takes.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help=f"modules to import (default: {' '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, help="fail if any module's median import time is over this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = measure(args.modules, args.runs)
+
+    failed = False
+    print(f"{'module':<34}{'median ms':>10}{'min ms':>10}  lazy modules loaded / side effects")
+    for module, stats in results.items():
+        problems = list(stats["lazy_loaded"])
+        if stats["created_dirs"]:
+            problems.append("created DATA_DIR")
+        if args.budget_ms is not None and stats["median_ms"] > args.budget_ms:
+            problems.append(f"over {args.budget_ms:g} ms budget")
+        failed = failed or bool(problems)
+        print(f"{module:<34}{stats['median_ms']:>10.1f}{stats['min_ms']:>10.1f}  {', '.join(problems) or '-'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+from benchmarks.fixture_client import DEFAULT_GAMES, FIXTURES_DIR, FixtureClient, record_fixtures
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_GAME_COUNTS = [1, 100, 1312]
+
+
+class StageRecorder:
+    # Adds up wall time, rows and calls per stage. With memory on,
+    # tracemalloc must already be running and each stage's peak allocation
+    # above what was live when it started is kept instead.
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stages = {}
+
+    def run(self, stage: str, rows: int, fn, *args, **kwargs):
+        if self.memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        stats = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "rows": 0, "peak_mb": None})
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+        stats["rows"] += rows
+        if self.memory:
+            peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / 2**20
+            stats["peak_mb"] = max(stats["peak_mb"] or 0.0, peak_mb)
+        return result
+
+
+def run_game(client: FixtureClient, game_id, recorder: StageRecorder):
+    # The stages of get_and_save_data_for_tableau one at a time, then the
+    # whole function on a fresh payload
+    from src import nhl_scraper as nhl
+    from src.xg_model import label_features, predict_xG
+
+    def payload():
+        return nhl.GamePayload(
+            game_id,
+            client,
+            play_by_play=client.response(game_id, "play_by_play"),
+            boxscore=client.response(game_id, "boxscore"),
+            shift_chart=client.response(game_id, "shift_chart"),
+        )
+
+    payloads = {game_id: payload()}
+    plays_and_shifts = client.plays_and_shifts(game_id)
+    plays = len(client.response(game_id, "play_by_play")["plays"])
+
+    tables = recorder.run("nhl_scraper", plays_and_shifts, nhl.nhl_scraper, [game_id], payloads=payloads)
+    shots_df, blocks_df, misses_df, goals_df, _, _, _, _, shifts_df, players_df, _, teams_df = tables
+
+    temp_df, time_df = recorder.run("shot_scraper2", plays, nhl.shot_scraper2, [game_id], payloads=payloads)
+    temp_df = recorder.run("get_skater_stats", len(temp_df), nhl.get_skater_stats, temp_df, client=client)
+    processed_df = recorder.run("get_processed_data", len(temp_df), nhl.get_processed_data, temp_df, numeric=True)
+    full_shots_df = recorder.run(
+        "add_skaters_on_ice", len(processed_df), nhl.add_skaters_on_ice, processed_df, time_df, shifts_df
+    )
+    full_shots_df["xG"] = recorder.run("predict_xG", len(full_shots_df), predict_xG, full_shots_df)
+    full_shots_df = label_features(full_shots_df)
+    recorder.run("tally_xG", len(full_shots_df), nhl.tally_xG, full_shots_df, players_df)
+
+    attempts_df = nhl.get_attempts_df(shots_df, misses_df, blocks_df, goals_df)
+    corsi_df = recorder.run("get_corsi_df", len(attempts_df), nhl.get_corsi_df, attempts_df, shifts_df)
+    recorder.run("tally_corsi", len(corsi_df), nhl.tally_corsi, corsi_df, players_df, game_id, payload=payloads[game_id])
+    recorder.run(
+        "get_box_score_dfs", len(players_df), nhl.get_box_score_dfs, game_id, players_df, teams_df, payload=payloads[game_id]
+    )
+
+    recorder.run(
+        "get_and_save_data_for_tableau",
+        plays_and_shifts,
+        nhl.get_and_save_data_for_tableau,
+        game_id,
+        payload=payload(),
+        update_master=False,
+        client=client,
+    )
+
+
+def run_pass(client: FixtureClient, game_ids: list, memory: bool) -> dict:
+    from src.master_store import MasterStore
+
+    recorder = StageRecorder(memory)
+    if memory:
+        tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for game_id in game_ids:
+                run_game(client, game_id, recorder)
+            recorder.run("master_compact", len(game_ids), MasterStore().compact, rebuild=True)
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return recorder.stages
+
+
+def run_benchmark(client: FixtureClient, n_games: int, memory: bool = True) -> dict:
+    game_ids = client.game_ids(n_games)
+    start = time.perf_counter()
+    stages = run_pass(client, game_ids, memory=False)
+    total_seconds = time.perf_counter() - start
+
+    # Memory is measured on a second pass since tracing slows everything down
+    if memory:
+        for stage, stats in run_pass(client, game_ids, memory=True).items():
+            stages[stage]["peak_mb"] = stats["peak_mb"]
+
+    for stats in stages.values():
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else None
+    return {"games": n_games, "total_seconds": total_seconds, "stages": stages}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latest_results(results_dir: str):
+    if not os.path.isdir(results_dir):
+        return None
+    names = sorted(name for name in os.listdir(results_dir) if name.endswith(".json"))
+    if not names:
+        return None
+    with open(os.path.join(results_dir, names[-1])) as f:
+        return json.load(f)
+
+
+def print_run(run: dict, previous: dict = None):
+    # previous is the same game count from the last stored results, if any
+    print(f"\n{run['games']} games, {run['total_seconds']:.1f}s")
+    print(f"{'stage':<32}{'calls':>7}{'seconds':>10}{'rows':>10}{'rows/s':>12}{'peak MB':>10}{'vs last':>10}")
+    for stage, stats in run["stages"].items():
+        rows_per_second = f"{stats['rows_per_second']:,.0f}" if stats["rows_per_second"] else "-"
+        peak = f"{stats['peak_mb']:.1f}" if stats["peak_mb"] is not None else "-"
+        change = "-"
+        if previous and stage in previous["stages"] and previous["stages"][stage]["seconds"]:
+            change = f"{stats['seconds'] / previous['stages'][stage]['seconds'] - 1:+.0%}"
+        print(
+            f"{stage:<32}{stats['calls']:>7}{stats['seconds']:>10.3f}{stats['rows']:>10}"
+            f"{rows_per_second:>12}{peak:>10}{change:>10}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Tableau report pipeline on recorded games.")
+    parser.add_argument("--games", nargs="+", type=int, default=DEFAULT_GAME_COUNTS, help="game counts to run (default: 1 100 1312)")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of recorded game fixtures")
+    parser.add_argument("--results", default=RESULTS_DIR, help="directory results are stored in and compared against")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass for peak memory")
+    parser.add_argument("--no-save", action="store_true", help="don't store the results")
+    parser.add_argument("--record", nargs="*", type=int, metavar="GAME_ID", help=f"record fixtures from the NHL API and exit (default games: {DEFAULT_GAMES})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.record is not None:
+        record_fixtures(args.record or DEFAULT_GAMES, args.fixtures)
+        return
+
+    # Outputs and the response cache go to a scratch directory; this has to be
+    # set before anything imports src.config
+    os.environ["NHL_DATA_DIR"] = tempfile.mkdtemp(prefix="nhl_benchmark_")
+
+    from src.xg_model import load_model
+
+    client = FixtureClient(args.fixtures)
+    load_model()
+    if client.synthetic:
+        # Timings on made-up games aren't comparable to anything
+        print(f"{args.fixtures} holds synthetic fixtures, results won't be compared or saved.")
+        args.no_save = True
+    previous = latest_results(args.results) if not client.synthetic else None
+    previous_runs = {run["games"]: run for run in previous["runs"]} if previous else {}
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fixtures": client.recorded,
+        "runs": [],
+    }
+    for n_games in args.games:
+        run = run_benchmark(client, n_games, memory=not args.no_memory)
+        results["runs"].append(run)
+        print_run(run, previous_runs.get(n_games))
+
+    if not args.no_save:
+        os.makedirs(args.results, exist_ok=True)
+        stamp = results["timestamp"].replace("-", "").replace(":", "")
+        path = os.path.join(args.results, f"{stamp}-{results['commit']}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
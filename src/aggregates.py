@@ -0,0 +1,246 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from src.config import DATA_DIR
+from src.writers import season_for_game
+from src.nhl_scraper import add_corsi_flags, add_shift_seconds, explode_on_ice, resolve_on_ice_players
+
+# Per-game partial aggregates: one row per player, venue and strength
+PARTIAL_KEYS = ["player_id", "venue", "strength"]
+PARTIAL_METRICS = ["toi_seconds", "xG_for", "xG_against", "corsi_for", "corsi_against", "attempts"]
+PARTIAL_COLUMNS = [
+    "game_id",
+    "game_date",
+    "player_id",
+    "name",
+    "position",
+    "team_id",
+    *PARTIAL_KEYS[1:],
+    *PARTIAL_METRICS,
+]
+
+# Splits combine() can break totals down by
+SPLITS = {"venue": ["Home", "Away"], "strength": ["EV", "PP", "SH"]}
+
+
+def strength(own_skaters, opposing_skaters) -> np.ndarray:
+    # EV/PP/SH from one team's point of view; unknown counts are EV
+    own = pd.to_numeric(pd.Series(own_skaters).astype(object), errors="coerce").to_numpy()
+    opposing = pd.to_numeric(pd.Series(opposing_skaters).astype(object), errors="coerce").to_numpy()
+    return np.select([own > opposing, own < opposing], ["PP", "SH"], default="EV")
+
+
+def _side_strength(long_df: pd.DataFrame) -> np.ndarray:
+    # Strength for the side each exploded on-ice row belongs to
+    home = (long_df["side"] == "Home").to_numpy()
+    home_skaters = long_df["home_skaters"].astype(object).to_numpy()
+    away_skaters = long_df["away_skaters"].astype(object).to_numpy()
+    return strength(np.where(home, home_skaters, away_skaters), np.where(home, away_skaters, home_skaters))
+
+
+def _xG_partials(full_shots_df: pd.DataFrame) -> pd.DataFrame:
+    long_df = explode_on_ice(full_shots_df, ["xG", "home", "home_skaters", "away_skaters"])
+    is_for = (long_df["side"] == long_df["home"]).to_numpy()
+    xg = long_df["xG"].to_numpy(dtype=float)
+    long_df = pd.DataFrame(
+        {
+            "player_id": long_df["player_id"],
+            "venue": long_df["side"],
+            "strength": _side_strength(long_df),
+            "xG_for": np.where(is_for, xg, 0.0),
+            "xG_against": np.where(is_for, 0.0, xg),
+        }
+    )
+    return long_df.groupby(PARTIAL_KEYS, sort=False)[["xG_for", "xG_against"]].sum()
+
+
+def _corsi_partials(corsi_df: pd.DataFrame, home_id) -> pd.DataFrame:
+    long_df = add_corsi_flags(explode_on_ice(corsi_df, ["event_owner", "home_skaters", "away_skaters"]), home_id)
+    long_df["venue"] = long_df["side"]
+    long_df["strength"] = _side_strength(long_df)
+    return long_df.groupby(PARTIAL_KEYS, sort=False)[["corsi_for", "corsi_against"]].sum()
+
+
+def _attempt_partials(corsi_df: pd.DataFrame, home_id) -> pd.DataFrame:
+    # Each shooter's own attempts, from the shooting team's point of view
+    home = (corsi_df["event_owner"] == home_id).to_numpy()
+    home_skaters = corsi_df["home_skaters"].astype(object).to_numpy()
+    away_skaters = corsi_df["away_skaters"].astype(object).to_numpy()
+    attempts = pd.DataFrame(
+        {
+            "player_id": corsi_df["shooter_id"].to_numpy(),
+            "venue": np.where(home, "Home", "Away"),
+            "strength": strength(np.where(home, home_skaters, away_skaters), np.where(home, away_skaters, home_skaters)),
+        }
+    )
+    attempts = attempts[attempts["player_id"].notna()]
+    return attempts.groupby(PARTIAL_KEYS, sort=False).size().to_frame("attempts")
+
+
+def _toi_partials(shifts_df: pd.DataFrame, goalie_ids) -> pd.DataFrame:
+    # Time on ice split by strength. Shifts are treated as [start, end) here
+    # so each one contributes exactly end - start seconds; skaters on ice are
+    # counted without the goalies.
+    shifts_copy = add_shift_seconds(shifts_df).dropna(subset=["start_total_seconds", "end_total_seconds"])
+    if shifts_copy.empty:
+        return pd.DataFrame(columns=["toi_seconds"], index=pd.MultiIndex.from_arrays([[], [], []], names=PARTIAL_KEYS))
+
+    starts = shifts_copy["start_total_seconds"].to_numpy(np.int64)
+    ends = shifts_copy["end_total_seconds"].to_numpy(np.int64)
+    shifts_copy["end_total_seconds"] = ends - 1
+    breaks = np.unique(np.concatenate([starts, ends]))
+    on_ice = resolve_on_ice_players(pd.Series(breaks), shifts_copy)
+    on_ice["seconds"] = np.diff(breaks, append=breaks[-1])
+
+    goalie_ids = set(goalie_ids)
+    home_skaters = np.array([sum(player not in goalie_ids for player in players) for players in on_ice["home_players"]])
+    away_skaters = np.array([sum(player not in goalie_ids for player in players) for players in on_ice["away_players"]])
+    on_ice["home_skaters"] = home_skaters
+    on_ice["away_skaters"] = away_skaters
+
+    long_df = explode_on_ice(on_ice, ["seconds", "home_skaters", "away_skaters"])
+    long_df["venue"] = long_df["side"]
+    long_df["strength"] = _side_strength(long_df)
+    return long_df.groupby(PARTIAL_KEYS, sort=False)["seconds"].sum().to_frame("toi_seconds")
+
+
+def game_partials(game_id, game_date, full_shots_df: pd.DataFrame, corsi_df: pd.DataFrame, shifts_df: pd.DataFrame, players_df: pd.DataFrame) -> pd.DataFrame:
+    # The game's contribution to every multi-game total, from the frames
+    # get_and_save_data_for_tableau already has
+    home_id = shifts_df["home_id"].iloc[0]
+    away_id = shifts_df["away_id"].iloc[0]
+    goalie_ids = players_df.loc[players_df["position"] == "G", "player_id"]
+
+    parts = [
+        _toi_partials(shifts_df, goalie_ids),
+        _xG_partials(full_shots_df),
+        _corsi_partials(corsi_df, home_id),
+        _attempt_partials(corsi_df, home_id),
+    ]
+    partials = pd.concat(parts, axis=1).fillna(0).reset_index()
+    for column in ["toi_seconds", "corsi_for", "corsi_against", "attempts"]:
+        partials[column] = partials[column].astype(np.int64)
+    partials["player_id"] = partials["player_id"].astype(np.int64)
+
+    partials = pd.merge(partials, players_df[["player_id", "name", "position"]], on="player_id", how="left")
+    partials["team_id"] = np.where(partials["venue"] == "Home", home_id, away_id)
+    partials["game_id"] = int(game_id)
+    partials["game_date"] = game_date
+    return partials.sort_values(PARTIAL_KEYS, kind="stable").reset_index(drop=True)[PARTIAL_COLUMNS]
+
+
+def last_n_games(partials: pd.DataFrame, n: int) -> pd.DataFrame:
+    # Only each player's n most recent games
+    games = partials[["player_id", "game_date", "game_id"]].drop_duplicates()
+    games = games.sort_values(["player_id", "game_date", "game_id"])
+    recent = games[games.groupby("player_id").cumcount(ascending=False) < n]
+    return partials.merge(recent[["player_id", "game_id"]], on=["player_id", "game_id"])
+
+
+def combine(partials: pd.DataFrame, splits: list = (), last_n: int = None) -> pd.DataFrame:
+    # Totals per player (and per split, e.g. ["venue"] or ["strength"]) over
+    # every game in partials, or each player's last_n games
+    if last_n is not None:
+        partials = last_n_games(partials, last_n)
+    keys = ["player_id", *splits]
+
+    ordered = partials.sort_values(["game_date", "game_id"], kind="stable")
+    grouped = ordered.groupby(keys, sort=False)
+    totals = grouped[PARTIAL_METRICS].sum()
+    totals.insert(0, "games", grouped["game_id"].nunique())
+    # Name, position and team from the player's latest game
+    latest = ordered.groupby("player_id", sort=False)[["name", "position", "team_id"]].last()
+    totals = totals.reset_index().merge(latest, on="player_id", how="left")
+
+    totals["xGF%"] = totals["xG_for"] / (totals["xG_for"] + totals["xG_against"])
+    totals["CF%"] = totals["corsi_for"] / (totals["corsi_for"] + totals["corsi_against"])
+    columns = [*keys, "name", "position", "team_id", "games", *PARTIAL_METRICS, "xGF%", "CF%"]
+    return totals.sort_values(keys, kind="stable").reset_index(drop=True)[columns]
+
+
+class AggregateStore:
+    # Per-game partials under DATA_DIR/aggregates/season=<s>/<game_id>.parquet.
+    # A game that is reprocessed just overwrites its own file. Each season
+    # also keeps every game's partials in one _partials.parquet with a
+    # manifest of the file versions in it, so reading a season only rereads
+    # the games that were added or corrected since.
+    def __init__(self, data_dir=None):
+        if data_dir is None:
+            data_dir = DATA_DIR
+        self.root = os.path.join(data_dir, "aggregates")
+
+    def season_dir(self, season) -> str:
+        return os.path.join(self.root, f"season={season}")
+
+    def game_path(self, game_id) -> str:
+        return os.path.join(self.season_dir(season_for_game(game_id)), f"{game_id}.parquet")
+
+    def save_game(self, game_id, partials: pd.DataFrame):
+        path = self.game_path(game_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        partials.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def game_versions(self, season) -> dict:
+        folder = self.season_dir(season)
+        if not os.path.isdir(folder):
+            return {}
+        return {
+            name.split(".")[0]: os.stat(os.path.join(folder, name)).st_mtime_ns
+            for name in os.listdir(folder)
+            if name.endswith(".parquet") and name[0].isdigit()
+        }
+
+    def partials(self, season) -> pd.DataFrame:
+        folder = self.season_dir(season)
+        combined_path = os.path.join(folder, "_partials.parquet")
+        manifest_path = os.path.join(folder, "_manifest.json")
+        current = self.game_versions(season)
+        try:
+            with open(manifest_path) as f:
+                compacted = json.load(f)["games"]
+            combined = pd.read_parquet(combined_path)
+        except (FileNotFoundError, ValueError, KeyError):
+            compacted, combined = {}, pd.DataFrame(columns=PARTIAL_COLUMNS)
+
+        stale = {game for game, version in compacted.items() if current.get(game) != version}
+        added = sorted((game for game in current if compacted.get(game) != current[game]), key=int)
+        if not stale and not added:
+            return combined
+
+        kept = combined[~combined["game_id"].astype(str).isin(stale)]
+        fresh = [pd.read_parquet(os.path.join(folder, f"{game}.parquet")) for game in added]
+        # An empty kept frame (the season's first write) would make concat warn
+        frames = [*([kept] if not kept.empty else []), *fresh]
+        combined = pd.concat(frames, ignore_index=True) if frames else kept.reset_index(drop=True)
+
+        os.makedirs(folder, exist_ok=True)
+        combined.to_parquet(f"{combined_path}.tmp", index=False)
+        os.replace(f"{combined_path}.tmp", combined_path)
+        with open(f"{manifest_path}.tmp", "w") as f:
+            json.dump({"games": current}, f, indent=2, sort_keys=True)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        print(f"Aggregate partials updated: {len(added)} games reread, {len(current)} total games.")
+        return combined
+
+    def write_reports(self, season, last_n: list = (5, 10)) -> dict:
+        # Season-to-date totals, home/away and strength splits and last-N
+        # totals as CSVs next to the partials
+        partials = self.partials(season)
+        reports = {
+            "season_totals": combine(partials),
+            "venue_splits": combine(partials, ["venue"]),
+            "strength_splits": combine(partials, ["strength"]),
+        }
+        for n in last_n:
+            reports[f"last_{n}_games"] = combine(partials, last_n=n)
+
+        folder = self.season_dir(season)
+        os.makedirs(folder, exist_ok=True)
+        for name, df in reports.items():
+            df.to_csv(os.path.join(folder, f"{name}.csv"), index=False)
+            print(f"Saved {name}.csv!")
+        return reports
@@ -0,0 +1,262 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from src.config import CACHE_DIR, env
+from src.metrics import count
+
+# Game states reported by the API once a game is over
+FINAL_GAME_STATES = {"OFF", "FINAL"}
+# FINAL can still get stats corrections; only OFF responses never change
+OFFICIAL_GAME_STATES = {"OFF"}
+
+LIVE_TTL_SECONDS = int(env("NHL_CACHE_LIVE_TTL", 30))
+FINAL_TTL_SECONDS = int(env("NHL_CACHE_FINAL_TTL", 60 * 60))
+CAREER_TTL_SECONDS = int(env("NHL_CACHE_CAREER_TTL", 24 * 60 * 60))
+MAX_CACHE_BYTES = int(env("NHL_CACHE_MAX_BYTES", 2 * 1024**3))
+
+
+class ResponseCache:
+    # Raw JSON responses stored as gzip blobs named by the sha256 of their
+    # content, with a sqlite index mapping request keys to blobs.
+    def __init__(self, cache_dir=None, max_bytes: int = MAX_CACHE_BYTES):
+        if cache_dir is None:
+            cache_dir = CACHE_DIR
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"), timeout=60, check_same_thread=False
+        )
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, endpoint TEXT, digest TEXT, "
+                "fetched_at REAL, expires_at REAL, last_access REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS final_games (game_id TEXT PRIMARY KEY)"
+            )
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.json.gz")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                count("cache_misses")
+                return None
+            digest = row[0]
+            try:
+                with gzip.open(self._blob_path(digest), "rt", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                count("cache_misses")
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?", (now, key)
+                )
+            self.hits += 1
+            count("cache_hits")
+            return data
+
+    def put(self, key, endpoint, data, ttl=None):
+        raw = json.dumps(data, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._blob_path(digest)
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with gzip.open(tmp_path, "wb") as f:
+                    f.write(raw)
+                os.replace(tmp_path, path)
+
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)",
+                    (digest, os.path.getsize(path)),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(key, endpoint, digest, fetched_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, endpoint, digest, now, expires_at, now),
+                )
+            self._evict()
+
+    def mark_final(self, game_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO final_games (game_id) VALUES (?)", (str(game_id),)
+            )
+
+    def is_final(self, game_id) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM final_games WHERE game_id = ?", (str(game_id),)
+            ).fetchone()
+        return row is not None
+
+    def total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _evict(self):
+        # Drop least recently used entries until the blobs fit under the cap
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        lru = self._conn.execute(
+            "SELECT key, digest FROM entries ORDER BY last_access ASC"
+        ).fetchall()
+        with self._conn:
+            for key, digest in lru:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                in_use = self._conn.execute(
+                    "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)
+                ).fetchone()
+                if in_use:
+                    continue
+                size = self._conn.execute(
+                    "SELECT size FROM blobs WHERE digest = ?", (digest,)
+                ).fetchone()
+                self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                try:
+                    os.remove(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                total -= size[0] if size else 0
+
+    def purge_expired(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?",
+                (time.time(),),
+            )
+
+
+class RateLimiter:
+    # Spaces out calls so that at most max_calls_per_second start each second,
+    # shared safely between threads.
+    def __init__(self, max_calls_per_second: float):
+        self.interval = 1.0 / max_calls_per_second if max_calls_per_second else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def cache_key(endpoint, arg) -> str:
+    return f"{endpoint}:{arg}"
+
+
+def response_ttl(cache: ResponseCache, endpoint, arg, data):
+    # Seconds to keep a response, or None to keep it forever
+    if endpoint == "player_career_stats":
+        return CAREER_TTL_SECONDS
+    if endpoint == "shift_chart_data":
+        # The shift chart has no game state of its own, so it is kept forever
+        # only once the play-by-play or boxscore has seen the game go official
+        return None if cache.is_final(arg) else LIVE_TTL_SECONDS
+    if data.get("gameState") in OFFICIAL_GAME_STATES:
+        cache.mark_final(arg)
+        return None
+    if data.get("gameState") in FINAL_GAME_STATES:
+        return FINAL_TTL_SECONDS
+    return LIVE_TTL_SECONDS
+
+
+class _CachedGameCenter:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def play_by_play(self, game_id):
+        return self._owner._cached(
+            "play_by_play", game_id,
+            lambda client: client.game_center.play_by_play(game_id=game_id),
+        )
+
+    def boxscore(self, game_id):
+        return self._owner._cached(
+            "boxscore", game_id,
+            lambda client: client.game_center.boxscore(game_id),
+        )
+
+    def shift_chart_data(self, game_id):
+        return self._owner._cached(
+            "shift_chart_data", game_id,
+            lambda client: client.game_center.shift_chart_data(game_id=game_id),
+        )
+
+
+class _CachedStats:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def player_career_stats(self, player_id):
+        return self._owner._cached(
+            "player_career_stats", player_id,
+            lambda client: client.stats.player_career_stats(player_id),
+        )
+
+
+class CachedNHLClient:
+    # Drop-in for the parts of NHLClient the pipeline uses, served from the
+    # on-disk ResponseCache when possible.
+    def __init__(self, client=None, cache: ResponseCache = None, rate_limiter: RateLimiter = None):
+        self._client = client
+        self.cache = cache if cache is not None else ResponseCache()
+        self.rate_limiter = rate_limiter
+        self.game_center = _CachedGameCenter(self)
+        self.stats = _CachedStats(self)
+
+    @property
+    def client(self):
+        if self._client is None:
+            from nhlpy import NHLClient
+
+            self._client = NHLClient()
+        return self._client
+
+    def _cached(self, endpoint, arg, fetch):
+        key = cache_key(endpoint, arg)
+        data = self.cache.get(key)
+        if data is None:
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            count("api_calls")
+            data = fetch(self.client)
+            self.cache.put(key, endpoint, data, response_ttl(self.cache, endpoint, arg, data))
+        return data
@@ -1,18 +1,51 @@
 import os
 from pathlib import Path
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
 # Define directories
 PARENT_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = PARENT_DIR / "data"
+
+_dotenv = None
+
+
+def _find_dotenv():
+    # The nearest .env from this package's directory upwards
+    here = Path(__file__).resolve().parent
+    for directory in [here, *here.parents]:
+        if (directory / ".env").is_file():
+            return directory / ".env"
+    return None
+
+
+def env(name: str, default=None):
+    # Settings come from the environment, then from a .env file. The file is
+    # read once and never copied into os.environ.
+    global _dotenv
+    if name in os.environ:
+        return os.environ[name]
+    if _dotenv is None:
+        path = _find_dotenv()
+        if path is None:
+            _dotenv = {}
+        else:
+            from dotenv import dotenv_values
+
+            _dotenv = dotenv_values(path)
+    value = _dotenv.get(name)
+    return default if value is None else value
+
+
+# NHL_DATA_DIR points outputs and the response cache somewhere else
+DATA_DIR = Path(env("NHL_DATA_DIR", PARENT_DIR / "data"))
 MODELS_DIR = PARENT_DIR / "models"
+CACHE_DIR = DATA_DIR / "cache"
+
 
-# Create directories if they don't exist
-for directory in [
-    DATA_DIR,
-    MODELS_DIR,
-]:
-    directory.mkdir(parents=True, exist_ok=True)
+def ensure_dirs():
+    # Create directories if they don't exist. Importing this module doesn't;
+    # entry points call this, and writers create what they write into.
+    for directory in [
+        DATA_DIR,
+        MODELS_DIR,
+        CACHE_DIR,
+    ]:
+        directory.mkdir(parents=True, exist_ok=True)
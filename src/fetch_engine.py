@@ -0,0 +1,144 @@
+import asyncio
+import random
+
+from src.api_cache import ResponseCache, cache_key, response_ttl
+from src.config import env
+from src.metrics import count
+
+# Point these at a local stub server to replay recorded responses
+API_WEB_URL = env("NHL_API_WEB_URL", "https://api-web.nhle.com/v1")
+API_STATS_URL = env("NHL_API_STATS_URL", "https://api.nhle.com/stats/rest/en")
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Same filter nhlpy's shift_chart_data sends
+SHIFT_CHART_EXPR = "gameId={game_id} and ((duration != '00:00' and typeCode = 517) or typeCode != 517 )"
+
+GAME_ENDPOINTS = ["play_by_play", "boxscore", "shift_chart_data"]
+
+
+class AsyncFetchEngine:
+    # Fetches play-by-play, boxscore and shift chart for many games over one
+    # pooled HTTP connection set, with at most max_concurrency requests in
+    # flight and exponential backoff on transient failures. Responses go
+    # through the same on-disk cache as CachedNHLClient.
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 10,
+        api_web_url: str = API_WEB_URL,
+        api_stats_url: str = API_STATS_URL,
+        cache: ResponseCache = None,
+        use_cache: bool = True,
+        transport=None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.api_web_url = api_web_url.rstrip("/")
+        self.api_stats_url = api_stats_url.rstrip("/")
+        self.cache = cache if cache is not None or not use_cache else ResponseCache()
+        # An httpx transport to send requests through instead of the network,
+        # e.g. httpx.MockTransport in tests
+        self.transport = transport
+        self.requests_made = 0
+
+    def _request_for(self, endpoint, game_id):
+        if endpoint == "play_by_play":
+            return f"{self.api_web_url}/gamecenter/{game_id}/play-by-play", None
+        if endpoint == "boxscore":
+            return f"{self.api_web_url}/gamecenter/{game_id}/boxscore", None
+        return f"{self.api_stats_url}/shiftcharts", {
+            "cayenneExp": SHIFT_CHART_EXPR.format(game_id=game_id),
+            "exclude": "eventDetails",
+        }
+
+    async def _get_json(self, session, semaphore, url, params=None):
+        import httpx
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with semaphore:
+                    self.requests_made += 1
+                    count("api_calls")
+                    response = await session.get(url, params=params)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = response.headers.get("Retry-After")
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} from {url}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                retry_after = None
+                error = e
+
+            if attempt == self.retries:
+                raise error
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else (
+                self.backoff * 2**attempt * (1 + random.random())
+            )
+            await asyncio.sleep(delay)
+
+    async def _fetch(self, session, semaphore, endpoint, game_id):
+        key = cache_key(endpoint, game_id)
+        if self.cache is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        url, params = self._request_for(endpoint, game_id)
+        data = await self._get_json(session, semaphore, url, params)
+        if self.cache is not None:
+            self.cache.put(key, endpoint, data, response_ttl(self.cache, endpoint, game_id, data))
+        return data
+
+    async def _fetch_game(self, session, semaphore, game_id) -> dict:
+        # The shift chart waits for the game state so a final game's shifts
+        # get cached forever
+        play_by_play, boxscore = await asyncio.gather(
+            self._fetch(session, semaphore, "play_by_play", game_id),
+            self._fetch(session, semaphore, "boxscore", game_id),
+        )
+        shift_chart = await self._fetch(session, semaphore, "shift_chart_data", game_id)
+        return {"play_by_play": play_by_play, "boxscore": boxscore, "shift_chart": shift_chart}
+
+    async def fetch_games_async(self, game_ids: list) -> dict:
+        import httpx
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+        )
+        async with httpx.AsyncClient(
+            limits=limits, timeout=self.timeout, follow_redirects=True, transport=self.transport
+        ) as session:
+            results = await asyncio.gather(
+                *[self._fetch_game(session, semaphore, game_id) for game_id in game_ids],
+                return_exceptions=True,
+            )
+
+        responses = {}
+        for game_id, result in zip(game_ids, results):
+            if isinstance(result, Exception):
+                print(f"Failed to fetch game {game_id}: {result}")
+                continue
+            responses[game_id] = result
+        return responses
+
+    def fetch_games(self, game_ids: list) -> dict:
+        # {game_id: {"play_by_play": ..., "boxscore": ..., "shift_chart": ...}}
+        # for every game that could be fetched
+        return asyncio.run(self.fetch_games_async(list(game_ids)))
+
+
+def event_loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
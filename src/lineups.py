@@ -0,0 +1,73 @@
+import os
+import pandas as pd
+
+from src.config import DATA_DIR
+from src.writers import season_for_game
+
+# One row per stretch of game seconds [start, end) with unchanged on-ice
+# players (goalies included), in shift chart order
+LINEUP_COLUMNS = ["start", "end", "home_players", "away_players"]
+
+
+class LineupStore:
+    # Lineup segments of final games, one parquet file per game under
+    # DATA_DIR/lineups/season=<s>/, so a season's lineups can be read back
+    # without touching the shift charts again
+    def __init__(self, data_dir=None):
+        if data_dir is None:
+            data_dir = DATA_DIR
+        self.root = os.path.join(data_dir, "lineups")
+
+    def season_dir(self, season) -> str:
+        return os.path.join(self.root, f"season={season}")
+
+    def path(self, game_id) -> str:
+        return os.path.join(self.season_dir(season_for_game(game_id)), f"{game_id}.parquet")
+
+    def save(self, game_id, segments: pd.DataFrame):
+        path = self.path(game_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        segments.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def load(self, game_id):
+        try:
+            segments = pd.read_parquet(self.path(game_id))
+        except FileNotFoundError:
+            return None
+        # Parquet lists come back as arrays
+        for column in ["home_players", "away_players"]:
+            segments[column] = [players.tolist() for players in segments[column]]
+        return segments
+
+    def load_season(self, season) -> pd.DataFrame:
+        # Every stored game's segments for the season, with a game_id column
+        folder = self.season_dir(season)
+        names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+        frames = []
+        for name in names:
+            if name.endswith(".parquet"):
+                game_id = int(name.split(".")[0])
+                frames.append(self.load(game_id).assign(game_id=game_id))
+        if not frames:
+            return pd.DataFrame(columns=["game_id", *LINEUP_COLUMNS])
+        return pd.concat(frames, ignore_index=True)[["game_id", *LINEUP_COLUMNS]]
+
+
+def line_combinations(segments: pd.DataFrame, side: str = "home", exclude=()) -> pd.DataFrame:
+    # Seconds each set of players spent on the ice together, most used
+    # first. exclude drops players (e.g. goalies) before grouping.
+    exclude = set(exclude)
+    players = segments[f"{side}_players"].map(
+        lambda ids: tuple(sorted(player for player in ids if player not in exclude))
+    )
+    combos = pd.DataFrame({"players": players, "seconds": segments["end"] - segments["start"]})
+    combos = combos[combos["players"].map(len) > 0]
+    return (
+        combos.groupby("players", sort=False)["seconds"]
+        .agg(["sum", "size"])
+        .rename(columns={"sum": "seconds", "size": "segments"})
+        .sort_values("seconds", ascending=False, kind="stable")
+        .reset_index()
+    )
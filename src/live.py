@@ -0,0 +1,378 @@
+import numpy as np
+import pandas as pd
+
+from src.api_cache import FINAL_GAME_STATES, CachedNHLClient
+from src.xg_model import DEFAULT_MODEL, label_features, predict_xG
+from src.rosters import PlayerRegistry, TeamRegistry
+from src.nhl_scraper import (
+    GamePayload,
+    add_attempt_seconds,
+    add_corsi_flags,
+    add_shift_seconds,
+    add_shot_seconds,
+    build_shot_info,
+    explode_on_ice,
+    fill_shot_attempts,
+    get_attempts_df,
+    get_box_score_dfs,
+    get_processed_data,
+    get_skater_stats,
+    get_toi_df,
+    nhl_scraper,
+    _players_on_ice,
+    shot_scraper2,
+    write_tables,
+)
+
+# How often the CLI polls a live game; matches the cache's live TTL
+DEFAULT_POLL_SECONDS = 30
+
+TOI_COLUMNS = ["name", "team_abbr", "position", "period", "is_home", "duration", "duration_min"]
+
+# LiveGame state for get_and_save_data_for_tableau(live=True), per game and
+# set of arguments it was created with
+_LIVE_GAMES = {}
+
+
+class ShiftIndex:
+    # Every shift seen so far for one game as per-team start/end/player arrays,
+    # so each poll only adds the new shifts and on-ice lookups never rebuild
+    # anything from the shift table. Arrays follow the latest shift chart's
+    # order, which is the order batch runs list on-ice players in.
+    def __init__(self, home_id, away_id):
+        self.team_ids = {"home_players": home_id, "away_players": away_id}
+        self.shift_ids = {column: np.empty(0, dtype=np.int64) for column in self.team_ids}
+        self.starts = {column: np.empty(0, dtype=np.int64) for column in self.team_ids}
+        self.ends = {column: np.empty(0, dtype=np.int64) for column in self.team_ids}
+        self.players = {column: np.empty(0, dtype=object) for column in self.team_ids}
+        self.frames = []
+
+    def __len__(self):
+        return sum(len(starts) for starts in self.starts.values())
+
+    def add(self, shifts_df: pd.DataFrame, shift_ids: list, chart_ids: list):
+        # shift_ids line up with the rows of shifts_df; chart_ids is every shift
+        # id in the current chart, in order
+        if shifts_df.empty:
+            return
+        self.frames.append(shifts_df)
+        shifts = add_shift_seconds(shifts_df)
+        shifts["shift_id"] = shift_ids
+        chart_position = {shift_id: i for i, shift_id in enumerate(chart_ids)}
+
+        for column, team_id in self.team_ids.items():
+            team_shifts = shifts[shifts["shift_team"] == team_id]
+            shift_ids = np.concatenate([self.shift_ids[column], team_shifts["shift_id"].to_numpy(np.int64)])
+            positions = [chart_position.get(shift_id, len(chart_position)) for shift_id in shift_ids]
+            order = np.argsort(positions, kind="stable")
+
+            self.shift_ids[column] = shift_ids[order]
+            self.starts[column] = np.concatenate(
+                [self.starts[column], team_shifts["start_total_seconds"].to_numpy(np.int64)]
+            )[order]
+            self.ends[column] = np.concatenate(
+                [self.ends[column], team_shifts["end_total_seconds"].to_numpy(np.int64)]
+            )[order]
+            self.players[column] = np.concatenate(
+                [self.players[column], team_shifts["player_id"].to_numpy(object)]
+            )[order]
+
+    def shifts_df(self) -> pd.DataFrame:
+        return pd.concat(self.frames, ignore_index=True)
+
+    def on_ice(self, game_seconds: pd.Series) -> pd.DataFrame:
+        # Same result as resolve_on_ice_players over the shifts added so far
+        times = game_seconds.to_numpy()
+        on_ice = {}
+        for column in self.team_ids:
+            if len(times):
+                on_ice[column] = _players_on_ice(
+                    times, self.starts[column], self.ends[column], self.players[column]
+                )
+            else:
+                on_ice[column] = []
+        return pd.DataFrame(on_ice, index=game_seconds.index)
+
+    def settled(self, df: pd.DataFrame, goalie_ids: list) -> np.ndarray:
+        # Live shift charts only list a shift once it's over, so an event's
+        # on-ice lists fill in over the following polls. Returns an (n, 2)
+        # array: whether each event's skaters are all known, and whether both
+        # goalies are. Skaters settle once each side has as many skaters as
+        # the situation code says both just before and just after the event,
+        # which catches line changes exactly at the event. Goalie shifts
+        # usually last the whole period, so goalies settle separately; empty
+        # nets never do and wait for the game to end.
+        times = df["game_seconds"].to_numpy()[:, None]
+        settled = np.ones((len(df), 2), dtype=bool)
+        for column, skaters in [("home_players", "home_skaters"), ("away_players", "away_skaters")]:
+            needed = df[skaters].astype(int).to_numpy()
+            starts = self.starts[column]
+            ends = self.ends[column]
+            is_goalie = np.isin(self.players[column], goalie_ids)
+            for on_ice in [(starts < times) & (ends >= times), (starts <= times) & (ends > times)]:
+                settled[:, 0] &= (on_ice & ~is_goalie).sum(axis=1) >= needed
+                settled[:, 1] &= (on_ice & is_goalie).any(axis=1)
+        return settled
+
+
+class RunningTally:
+    # Per (player_id, period) totals that events are added to in the order
+    # they settle, so float sums come out the same as tallying them all at once
+    def __init__(self, columns: list, dtype=float):
+        self.columns = columns
+        self.slots = {}
+        self.sides = []
+        self.values = np.zeros((0, len(columns)), dtype=dtype)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, long_df: pd.DataFrame):
+        # long_df is explode_on_ice output with a column per tallied value
+        slots = np.empty(len(long_df), dtype=np.intp)
+        for i, key in enumerate(zip(long_df["player_id"], long_df["period"], long_df["side"])):
+            slot = self.slots.get(key[:2])
+            if slot is None:
+                slot = self.slots[key[:2]] = len(self.sides)
+                self.sides.append(None)
+            self.sides[slot] = key[2]
+            slots[i] = slot
+
+        if len(self.sides) > len(self.values):
+            grown = np.zeros((len(self.sides), len(self.columns)), dtype=self.values.dtype)
+            grown[: len(self.values)] = self.values
+            self.values = grown
+        for i, column in enumerate(self.columns):
+            np.add.at(self.values[:, i], slots, long_df[column].to_numpy(dtype=self.values.dtype))
+
+    def frame(self, players_df: pd.DataFrame, side_column: str = None) -> pd.DataFrame:
+        keys = list(self.slots)
+        df = pd.DataFrame(
+            {
+                "player_id": pd.Series([player_id for player_id, _ in keys], dtype="int64"),
+                "period": pd.Series([period for _, period in keys], dtype="int64"),
+            }
+        )
+        for i, column in enumerate(self.columns):
+            df[column] = self.values[: len(keys), i]
+        if side_column is not None:
+            df[side_column] = pd.Series(self.sides, dtype=object)
+        df = pd.merge(df, players_df, on="player_id", how="left")
+        return df.sort_values(by=["name", "period"]).reset_index(drop=True)
+
+
+class LiveGame:
+    # Incremental version of get_and_save_data_for_tableau for a game in
+    # progress. Each poll parses, scores and tallies only the plays and shifts
+    # that weren't there on the previous poll, then rewrites the game's tables.
+    def __init__(self, game_id, model_name: str = DEFAULT_MODEL, output_formats: tuple = ("csv",), client=None, update_master: bool = True):
+        self.game_id = game_id
+        self.model_name = model_name
+        self.output_formats = output_formats
+        self.update_master = update_master
+        self.client = client if client is not None else CachedNHLClient()
+        self.players = PlayerRegistry()
+        self.teams = TeamRegistry()
+        self.seen_events = set()
+        self.seen_shifts = set()
+        self.last_event_id = None
+        self.shift_index = None
+        self.final = False
+        self.polls = 0
+
+        # Scored shots (shot_location_info) and whether each one's skaters and
+        # goalies are still waiting on shifts before its xG can be tallied
+        self.shots = None
+        self.shot_pending = np.empty((0, 2), dtype=bool)
+        # Shot attempts still waiting on shifts for Corsi, and every attempt
+        # so far for the attempt counts
+        self.pending_attempts = None
+        self.attempt_pending = np.empty((0, 2), dtype=bool)
+        self.attempts = []
+
+        self.xG = RunningTally(["xG_for", "xG_against"], float)
+        self.corsi = RunningTally(["corsi_for", "corsi_against"], int)
+
+    def poll(self):
+        # Returns the same frames as get_and_save_data_for_tableau, or None if
+        # the game hasn't started yet
+        self.polls += 1
+        payload = GamePayload(self.game_id, self.client)
+        pbp = payload.play_by_play
+        if "score" not in payload.boxscore["awayTeam"]:
+            print(f"Game {self.game_id} hasn't started yet.")
+            return None
+        was_final = self.final
+        self.final = pbp.get("gameState") in FINAL_GAME_STATES
+
+        events = [event for event in payload.events if event.event_id not in self.seen_events]
+        shifts = [shift for shift in payload.shift_chart["data"] if shift["id"] not in self.seen_shifts]
+        new_payload = GamePayload(
+            self.game_id,
+            self.client,
+            play_by_play=pbp,
+            boxscore=payload.boxscore,
+            shift_chart={"data": shifts},
+            events=events,
+        )
+        payloads = {self.game_id: new_payload}
+
+        shots_df, blocks_df, misses_df, goals_df, _, _, _, _, shifts_df, _, _, _ = nhl_scraper(
+            [self.game_id], payloads=payloads, player_registry=self.players, team_registry=self.teams
+        )
+        if self.shift_index is None:
+            self.shift_index = ShiftIndex(pbp["homeTeam"]["id"], pbp["awayTeam"]["id"])
+        self.shift_index.add(
+            shifts_df,
+            [shift["id"] for shift in shifts],
+            [shift["id"] for shift in payload.shift_chart["data"]],
+        )
+
+        self._add_shots(payloads)
+        self._add_attempts(get_attempts_df(shots_df, misses_df, blocks_df, goals_df))
+        if self.final and not was_final:
+            self._reset_tallies()
+        self._settle_shots()
+        self._settle_attempts(pbp["homeTeam"]["id"])
+
+        self.seen_events.update(event.event_id for event in events)
+        self.seen_shifts.update(shift["id"] for shift in shifts)
+        if events:
+            self.last_event_id = events[-1].event_id
+        print(
+            f"Game {self.game_id} poll {self.polls}: {len(events)} new plays, {len(shifts)} new shifts, "
+            f"{int(self.shot_pending.any(axis=1).sum())} shots waiting on shifts"
+        )
+        return self._write(payload)
+
+    def _add_shots(self, payloads: dict):
+        temp_df, time_df = shot_scraper2([self.game_id], payloads=payloads)
+        if temp_df.empty:
+            return
+        temp_df = get_skater_stats(temp_df, client=self.client)
+        processed_df = get_processed_data(temp_df, numeric=True)
+        new_shots = add_shot_seconds(processed_df, time_df)
+        new_shots["home_players"] = None
+        new_shots["away_players"] = None
+        new_shots["xG"] = predict_xG(new_shots, self.model_name)
+        new_shots = label_features(new_shots)
+
+        if self.shots is None:
+            self.shots = new_shots.reset_index(drop=True)
+        else:
+            self.shots = pd.concat([self.shots, new_shots], ignore_index=True)
+        self.shot_pending = np.concatenate([self.shot_pending, np.ones((len(new_shots), 2), dtype=bool)])
+
+    def _add_attempts(self, attempts_df: pd.DataFrame):
+        self.attempts.append(attempts_df)
+        if attempts_df.empty:
+            return
+        attempts_df = add_attempt_seconds(attempts_df)
+        if self.pending_attempts is None:
+            self.pending_attempts = attempts_df
+        else:
+            self.pending_attempts = pd.concat([self.pending_attempts, attempts_df], ignore_index=True)
+        self.attempt_pending = np.concatenate([self.attempt_pending, np.ones((len(attempts_df), 2), dtype=bool)])
+
+    def _reset_tallies(self):
+        # An event that settled early is never looked at again, so shifts
+        # that showed up after it (overlapping line changes, understated
+        # situation codes) are missing from its tallies. Once the game is
+        # final every event is tallied again against the full shift chart.
+        self.xG = RunningTally(["xG_for", "xG_against"], float)
+        self.corsi = RunningTally(["corsi_for", "corsi_against"], int)
+        if self.shots is not None:
+            self.shot_pending = np.ones((len(self.shots), 2), dtype=bool)
+        attempts = [attempts_df for attempts_df in self.attempts if not attempts_df.empty]
+        if attempts:
+            self.pending_attempts = add_attempt_seconds(pd.concat(attempts, ignore_index=True))
+            self.attempt_pending = np.ones((len(self.pending_attempts), 2), dtype=bool)
+
+    def _goalie_ids(self) -> list:
+        players_df = self.players.players_frame()
+        return players_df.loc[players_df["position"] == "G", "player_id"].tolist()
+
+    def _newly_settled(self, df: pd.DataFrame, pending: np.ndarray, columns: list) -> pd.DataFrame:
+        # explode_on_ice rows for the players whose part of an event settled
+        # on this poll. Updates pending (skaters, goalies) in place.
+        goalie_ids = self._goalie_ids()
+        if self.final:
+            settled = np.ones_like(pending)
+        else:
+            settled = self.shift_index.settled(df, goalie_ids)
+        newly = pending & settled
+        pending &= ~settled
+
+        rows = np.flatnonzero(newly.any(axis=1))
+        long_df = explode_on_ice(df.iloc[rows].assign(settle_row=rows), columns + ["settle_row"])
+        is_goalie = long_df["player_id"].isin(goalie_ids).to_numpy()
+        keep = newly[long_df["settle_row"].to_numpy(), is_goalie.astype(int)]
+        return long_df[keep]
+
+    def _settle_shots(self):
+        if self.shots is None or not self.shot_pending.any():
+            return
+        rows = np.flatnonzero(self.shot_pending.any(axis=1))
+        on_ice = self.shift_index.on_ice(self.shots["game_seconds"].iloc[rows])
+        for column in ["home_players", "away_players"]:
+            self.shots.iloc[rows, self.shots.columns.get_loc(column)] = on_ice[column].to_numpy()
+
+        pending = self.shot_pending[rows]
+        long_df = self._newly_settled(self.shots.iloc[rows], pending, ["xG", "home", "period"])
+        self.shot_pending[rows] = pending
+        is_for = (long_df["side"] == long_df["home"]).to_numpy()
+        xg = long_df["xG"].to_numpy(dtype=float)
+        self.xG.add(long_df.assign(xG_for=np.where(is_for, xg, 0.0), xG_against=np.where(is_for, 0.0, xg)))
+
+    def _settle_attempts(self, home_id):
+        if self.pending_attempts is None or self.pending_attempts.empty:
+            return
+        attempts = self.pending_attempts
+        attempts[["home_players", "away_players"]] = self.shift_index.on_ice(attempts["game_seconds"])
+        long_df = self._newly_settled(attempts, self.attempt_pending, ["event_owner", "period"])
+        self.corsi.add(add_corsi_flags(long_df, home_id))
+
+        still_pending = self.attempt_pending.any(axis=1)
+        self.pending_attempts = attempts[still_pending].reset_index(drop=True)
+        self.attempt_pending = self.attempt_pending[still_pending]
+
+    def _write(self, payload: GamePayload):
+        players_df = self.players.players_frame()
+        teams_df = self.teams.teams_frame()
+
+        xG_totals = self.xG.frame(players_df, side_column="is_home")
+        corsi_totals = self.corsi.frame(players_df)
+        full_attempts_df = fill_shot_attempts(pd.concat(self.attempts, ignore_index=True), players_df)
+        final_df = build_shot_info(xG_totals, corsi_totals, full_attempts_df, teams_df)
+
+        if len(self.shift_index):
+            toi_df = get_toi_df(shifts_df=self.shift_index.shifts_df(), players_df=players_df, teams_df=teams_df)
+        else:
+            toi_df = pd.DataFrame(columns=TOI_COLUMNS)
+        score_df, skater_box_score, goalie_box_score = get_box_score_dfs(
+            game_id=self.game_id, players_df=players_df, teams_df=teams_df, payload=payload
+        )
+        full_shots_df = self.shots if self.shots is not None else pd.DataFrame()
+
+        tables = {
+            "shot_info": final_df.fillna(0),
+            "toi_info": toi_df,
+            "score_info": score_df,
+            "skater_box_info": skater_box_score,
+            "goalie_box_info": goalie_box_score,
+            "shot_location_info": full_shots_df,
+        }
+        # Snapshots stay out of DATA_DIR/raw until the game is final, so the
+        # master tables and is_ingested() only ever see the finished game
+        write_tables(tables, self.game_id, self.output_formats, self.update_master, final=self.final)
+
+        return final_df, toi_df, score_df, skater_box_score, goalie_box_score, full_shots_df
+
+
+def live_game(game_id, model_name: str = DEFAULT_MODEL, output_formats: tuple = ("csv",), client=None, update_master: bool = True) -> LiveGame:
+    # A call with other arguments gets its own LiveGame instead of one that
+    # would ignore them
+    key = (game_id, model_name, tuple(output_formats), client, update_master)
+    if key not in _LIVE_GAMES:
+        _LIVE_GAMES[key] = LiveGame(game_id, model_name, output_formats, client, update_master)
+    return _LIVE_GAMES[key]
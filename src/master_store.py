@@ -0,0 +1,160 @@
+import io
+import os
+import csv
+import json
+import pandas as pd
+
+from src.config import DATA_DIR
+
+# Tables written for every game, in the order they are saved
+OUTPUT_TABLES = [
+    "shot_info",
+    "toi_info",
+    "score_info",
+    "skater_box_info",
+    "goalie_box_info",
+    "shot_location_info",
+]
+
+
+class MasterStore:
+    # Builds DATA_DIR/master/<table>.csv incrementally from the per-game CSVs
+    # in DATA_DIR/raw/<game_id>. A manifest records which games (and which
+    # version of their files) are already in the master tables, so new games
+    # are appended as text and only corrected games force a rewrite. Master
+    # rows get a leading game_id column the per-game files don't have.
+    def __init__(self, data_dir=None, tables: list = OUTPUT_TABLES):
+        if data_dir is None:
+            data_dir = DATA_DIR
+        self.raw_dir = os.path.join(data_dir, "raw")
+        self.master_dir = os.path.join(data_dir, "master")
+        self.manifest_path = os.path.join(self.master_dir, "_manifest.json")
+        self.tables = tables
+
+    def segment_path(self, game_id, table: str) -> str:
+        return os.path.join(self.raw_dir, str(game_id), f"{table}.csv")
+
+    def master_path(self, table: str) -> str:
+        return os.path.join(self.master_dir, f"{table}.csv")
+
+    def segment_version(self, game_id):
+        # Latest modification time of the game's files, or None if the game
+        # hasn't been fully written yet
+        versions = []
+        for table in self.tables:
+            try:
+                versions.append(os.stat(self.segment_path(game_id, table)).st_mtime_ns)
+            except FileNotFoundError:
+                return None
+        return max(versions)
+
+    def ingested_games(self) -> dict:
+        if not os.path.isdir(self.raw_dir):
+            return {}
+        games = {}
+        for name in os.listdir(self.raw_dir):
+            if not name.isdigit():
+                continue
+            version = self.segment_version(name)
+            if version is not None:
+                games[name] = version
+        return games
+
+    def is_ingested(self, game_id) -> bool:
+        return self.segment_version(game_id) is not None
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"games": {}}
+
+    def _save_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _read_segment(self, game_id, table: str):
+        # The segment's header and rows with game_id prepended to each
+        with open(self.segment_path(game_id, table), newline="") as f:
+            text = f.read()
+        if not text.strip():
+            return None, ""
+        header, _, body = text.partition("\n")
+        if '"' in body:
+            # Quoted fields can span lines, so let csv find the rows
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator="\n")
+            for row in csv.reader(io.StringIO(body)):
+                writer.writerow([game_id, *row])
+            body = out.getvalue()
+        else:
+            body = "".join(f"{game_id},{line}\n" for line in body.splitlines())
+        return f"game_id,{header}", body
+
+    def _append_table(self, table: str, game_ids: list) -> bool:
+        # Append the new games' rows as plain text. Returns False when a header
+        # doesn't match the master file, in which case the caller rewrites it.
+        path = self.master_path(table)
+        with open(path, newline="") as f:
+            master_header = f.readline().rstrip("\n")
+
+        segments = [self._read_segment(game_id, table) for game_id in game_ids]
+        if any(header is not None and header != master_header for header, _ in segments):
+            return False
+
+        with open(path, "a", newline="") as f:
+            for header, body in segments:
+                if body:
+                    f.write(body if body.endswith("\n") else body + "\n")
+        return True
+
+    def _rewrite_table(self, table: str, game_ids: list):
+        segments = [self._read_segment(game_id, table) for game_id in game_ids]
+        headers = {header for header, _ in segments if header is not None}
+        tmp_path = f"{self.master_path(table)}.tmp"
+
+        if len(headers) <= 1:
+            with open(tmp_path, "w", newline="") as f:
+                f.write(next(iter(headers), "") + "\n")
+                for _, body in segments:
+                    if body:
+                        f.write(body if body.endswith("\n") else body + "\n")
+        else:
+            # Columns changed between games, so let pandas line them up
+            frames = [
+                pd.read_csv(self.segment_path(game_id, table)).assign(game_id=int(game_id))
+                for game_id, (header, _) in zip(game_ids, segments)
+                if header is not None
+            ]
+            frames = [frame[["game_id", *frame.columns[:-1]]] for frame in frames]
+            pd.concat(frames, ignore_index=True).to_csv(tmp_path, index=False)
+
+        os.replace(tmp_path, self.master_path(table))
+
+    def compact(self, rebuild: bool = False):
+        os.makedirs(self.master_dir, exist_ok=True)
+        # Master files from before the manifest existed can't be appended to
+        if not os.path.exists(self.manifest_path):
+            rebuild = True
+        current = self.ingested_games()
+        compacted = self.load_manifest()["games"]
+
+        new_games = sorted((g for g in current if g not in compacted), key=int)
+        changed_games = sorted((g for g, v in compacted.items() if current.get(g) != v), key=int)
+        all_games = sorted(current, key=int)
+
+        for table in self.tables:
+            if rebuild or changed_games or not os.path.exists(self.master_path(table)):
+                self._rewrite_table(table, all_games)
+            elif new_games and not self._append_table(table, new_games):
+                self._rewrite_table(table, all_games)
+
+        self._save_manifest({"games": current})
+        print(
+            f"Master tables updated: {len(new_games)} new, "
+            f"{len(changed_games)} changed, {len(all_games)} total games."
+        )
+        return new_games, changed_games
@@ -0,0 +1,96 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Process-wide counters bumped by the API client, cache and fetch engine.
+# Stages record how much each one grew while they ran, so games processed
+# concurrently in one process would share them.
+COUNTERS = ["api_calls", "cache_hits", "cache_misses"]
+
+_counts = dict.fromkeys(COUNTERS, 0)
+_lock = threading.Lock()
+
+
+def count(name: str, n: int = 1):
+    with _lock:
+        _counts[name] += n
+
+
+def counts() -> dict:
+    with _lock:
+        return dict(_counts)
+
+
+# Prometheus metric name and help text for each field summed over stages
+PROMETHEUS_METRICS = {
+    "runs": ("nhl_pipeline_stage_runs_total", "Times the stage ran."),
+    "seconds": ("nhl_pipeline_stage_seconds_total", "Wall time spent in the stage."),
+    "rows": ("nhl_pipeline_stage_rows_total", "Rows the stage produced."),
+    "api_calls": ("nhl_pipeline_api_calls_total", "NHL API requests made during the stage."),
+    "cache_hits": ("nhl_pipeline_cache_hits_total", "Responses served from the cache during the stage."),
+    "cache_misses": ("nhl_pipeline_cache_misses_total", "Cache lookups that missed during the stage."),
+    "dropped_shots": ("nhl_pipeline_dropped_shots_total", "Shots left out of the xG input for missing data."),
+}
+
+
+class PipelineMetrics:
+    # One record per stage run: wall time, rows produced and the API calls and
+    # cache hits/misses made while it ran. Records are plain dicts so batch
+    # workers can send them back to the parent process.
+    def __init__(self, records: list = None):
+        self.records = records if records is not None else []
+
+    @contextmanager
+    def stage(self, name: str, game_id=None):
+        # Set record["rows"] inside the block to count the rows produced
+        record = {"game_id": game_id, "stage": name, "rows": None}
+        before = counts()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            after = counts()
+            for counter in COUNTERS:
+                record[counter] = after[counter] - before[counter]
+            self.records.append(record)
+
+    def extend(self, records: list):
+        self.records.extend(records)
+
+    def totals(self) -> dict:
+        # {stage: {runs, seconds, rows, api_calls, ...}} in first-run order
+        totals = {}
+        for record in self.records:
+            stage = totals.setdefault(record["stage"], dict.fromkeys(PROMETHEUS_METRICS, 0))
+            stage["runs"] += 1
+            for field in PROMETHEUS_METRICS:
+                if field != "runs":
+                    stage[field] += record.get(field) or 0
+        return totals
+
+    def to_json_lines(self) -> str:
+        return "".join(json.dumps(record) + "\n" for record in self.records)
+
+    def to_prometheus(self) -> str:
+        # Totals per stage in the text exposition format, e.g. for the node
+        # exporter's textfile collector
+        totals = self.totals()
+        lines = []
+        for field, (metric, help_text) in PROMETHEUS_METRICS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for stage, values in totals.items():
+                lines.append(f'{metric}{{stage="{stage}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        # .prom files get Prometheus text, anything else gets JSON lines
+        # appended so runs accumulate in one file
+        if str(path).endswith(".prom"):
+            with open(path, "w") as f:
+                f.write(self.to_prometheus())
+        else:
+            with open(path, "a") as f:
+                f.write(self.to_json_lines())
@@ -1,15 +1,21 @@
 import sys
 import os
 import pandas as pd
-from nhlpy import NHLClient
 import numpy as np
-from collections import defaultdict
 import itertools
-import joblib
-import shutil
+from array import array
+from typing import NamedTuple, Optional
 
-from src.config import MODELS_DIR
+from src.api_cache import FINAL_GAME_STATES, CachedNHLClient
 from src.config import DATA_DIR
+from src.fetch_engine import AsyncFetchEngine, event_loop_running
+from src.xg_model import DEFAULT_MODEL, label_features, predict_xG
+from src.writers import get_writer, to_arrow_table
+from src.master_store import MasterStore
+from src.lineups import LINEUP_COLUMNS, LineupStore
+from src.metrics import PipelineMetrics
+from src.rosters import PlayerRegistry, TeamRegistry
+from src.player_store import CAREER_STATS_RATE, CAREER_STATS_WORKERS, PlayerAttributeStore
 
 def time_remaining(start_time_str, end_time_str):
     # Define total period as 20 minutes (1200 seconds)
@@ -54,6 +60,27 @@ def seconds_to_time(total_sec):
     return f"{mins:02}:{sec:02}"
 
 
+def clock_seconds(times: pd.Series) -> np.ndarray:
+    # Vectorized time_to_seconds for a column of MM:SS strings
+    parts = times.str.split(":", n=1, expand=True)
+    return (parts[0].astype(np.int32) * 60 + parts[1].astype(np.int32)).to_numpy(np.int32)
+
+
+def clock_strings(seconds) -> pd.Series:
+    # Vectorized seconds_to_time. Negative values mark a missing clock and
+    # come back as None.
+    seconds = np.asarray(seconds)
+    if not len(seconds):
+        return pd.Series([], dtype=object)
+    minutes, secs = np.divmod(np.maximum(seconds, 0), 60)
+    text = np.char.add(
+        np.char.add(np.char.zfill(minutes.astype(str), 2), ":"),
+        np.char.zfill(secs.astype(str), 2),
+    ).astype(object)
+    text[seconds < 0] = None
+    return pd.Series(text, dtype=object)
+
+
 def second_diff(time1, time2):
     minutes1 = int(time1[0:2])
     minutes2 = int(time2[0:2])
@@ -62,515 +89,315 @@ def second_diff(time1, time2):
     return abs((minutes2 * 60 + seconds2) - (minutes1 * 60 + seconds1))
 
 
-def nhl_scraper(game_ids: list):
-
-    client = NHLClient()
-    shots = []
-    blocks = []
-    misses = []
-    goals = []
-    hits = []
-    give_take = []
-    faceoffs = []
-    pens = []
-    shifts = []
-    players = []
-    games = []
-    teams = []
-
-    conference_dict = {
-        "FLA": "Eastern",
-        "TOR": "Eastern",
-        "TBL": "Eastern",
-        "OTT": "Eastern",
-        "DET": "Eastern",
-        "MTL": "Eastern",
-        "BOS": "Eastern",
-        "BUF": "Eastern",
-        "WSH": "Eastern",
-        "CAR": "Eastern",
-        "NJD": "Eastern",
-        "CBJ": "Eastern",
-        "NYR": "Eastern",
-        "NYI": "Eastern",
-        "PHI": "Eastern",
-        "PIT": "Eastern",
-        "WPG": "Western",
-        "DAL": "Western",
-        "MIN": "Western",
-        "COL": "Western",
-        "STL": "Western",
-        "UTA": "Western",
-        "NSH": "Western",
-        "CHI": "Western",
-        "VGK": "Western",
-        "EDM": "Western",
-        "CGY": "Western",
-        "VAN": "Western",
-        "ANA": "Western",
-        "SEA": "Western",
-        "SJS": "Western",
-        "LAK": "Western",
-    }
-
-    division_dict = {
-        "FLA": "Atlantic",
-        "TOR": "Atlantic",
-        "TBL": "Atlantic",
-        "OTT": "Atlantic",
-        "DET": "Atlantic",
-        "MTL": "Atlantic",
-        "BOS": "Atlantic",
-        "BUF": "Atlantic",
-        "WSH": "Metropolitan",
-        "CAR": "Metropolitan",
-        "NJD": "Metropolitan",
-        "CBJ": "Metropolitan",
-        "NYR": "Metropolitan",
-        "NYI": "Metropolitan",
-        "PHI": "Metropolitan",
-        "PIT": "Metropolitan",
-        "WPG": "Central",
-        "DAL": "Central",
-        "MIN": "Central",
-        "COL": "Central",
-        "STL": "Central",
-        "UTA": "Central",
-        "NSH": "Central",
-        "CHI": "Central",
-        "VGK": "Pacific",
-        "EDM": "Pacific",
-        "CGY": "Pacific",
-        "VAN": "Pacific",
-        "ANA": "Pacific",
-        "SEA": "Pacific",
-        "SJS": "Pacific",
-        "LAK": "Pacific",
-    }
-
-    for game in game_ids:
-        pbp = client.game_center.play_by_play(game_id=game)
-
-        team_id_dict = {}
-        home_id = pbp["homeTeam"]["id"]
-        home_team = pbp["homeTeam"]["abbrev"]
-        away_id = pbp["awayTeam"]["id"]
-        away_team = pbp["awayTeam"]["abbrev"]
-        team_id_dict[home_id] = home_team
-        team_id_dict[away_id] = away_team
-        h_city = pbp["homeTeam"]["placeName"]["default"]
-        h_name = pbp["homeTeam"]["commonName"]["default"]
-        h_conference = conference_dict[home_team]
-        h_division = division_dict[home_team]
-        a_city = pbp["awayTeam"]["placeName"]["default"]
-        a_name = pbp["awayTeam"]["commonName"]["default"]
-        a_conference = conference_dict[away_team]
-        a_division = division_dict[away_team]
-
-        if (home_id, home_team, h_city, h_name, h_conference, h_division) not in teams:
-            teams.append((home_id, home_team, h_city, h_name, h_conference, h_division))
-
-        if (
-            away_id,
-            away_team,
-            a_city,
-            a_name,
-            a_conference,
-            a_division,
-        ) not in teams:
-            teams.append((away_id, away_team, a_city, a_name, a_conference, a_division))
-
-        box_score = client.game_center.boxscore(game)
-
-        if "score" not in box_score["awayTeam"]:
-            continue
-
-        away_score = box_score["awayTeam"]["score"]
-        home_score = box_score["homeTeam"]["score"]
-        if home_score > away_score:
-            winner = home_id
-            loser = away_id
-        else:
-            winner = away_id
-            loser = home_id
-
-        games.append((game, away_id, away_score, home_id, home_score, winner, loser))
-
-        rosters = {}
-        for guy in pbp["rosterSpots"]:
-            rosters[guy["playerId"]] = {
-                "name": guy["firstName"]["default"] + " " + guy["lastName"]["default"],
-                "position": guy["positionCode"],
-                "jersey": guy["sweaterNumber"],
-                "team": guy["teamId"],
-            }
-
-        shifts_list = client.game_center.shift_chart_data(game_id=game)["data"]
-
-        for player in rosters.keys():
-            if player not in players:
-                name = rosters[player]["name"]
-                position = rosters[player]["position"]
-                team = rosters[player]["team"]
-                players.append((player, name, team, position))
-
-        for shift in shifts_list:
-            start_time = shift["startTime"]
-            end_time = shift["endTime"]
-            player_id = shift["playerId"]
-            shift_team_id = shift["teamId"]
-            duration = shift["duration"]
-            period = shift["period"]
-            shifts.append(
-                (
-                    game,
-                    home_id,
-                    away_id,
-                    shift_team_id,
-                    period,
-                    start_time,
-                    end_time,
-                    duration,
-                    player_id,
+# Per-game constant columns stored once per game instead of once per row
+GAME_COLUMNS = ["game", "home_id", "home_team", "away_id", "away_team"]
+
+# Column kinds for EventColumns: typed arrays for non-null integers,
+# nullable Int64 for IDs that can be missing, dictionary-encoded categoricals
+# for repeated strings, lists otherwise
+EVENT_COLUMN_KINDS = {
+    "home_id": "int64",
+    "away_id": "int64",
+    "game": "int64",
+    "event_owner": "int64",
+    "shift_team": "int64",
+    "shooter_id": "Int64",
+    "goalie_id": "Int64",
+    "blocked_by_id": "Int64",
+    "primary_assist_id": "Int64",
+    "secondary_assist_id": "Int64",
+    "hitter_id": "Int64",
+    "hittee_id": "Int64",
+    "player_id": "Int64",
+    "win_player_id": "Int64",
+    "loss_player_id": "Int64",
+    "drawer_id": "Int64",
+    "guilty_id": "Int64",
+    "period": "int32",
+    "event_id": "int32",
+    "rebound": "int32",
+    "rush": "int32",
+    "x": "int32",
+    "y": "int32",
+    "home_team": "category",
+    "away_team": "category",
+    "period_type": "category",
+    "last_play": "category",
+    "play_type": "category",
+    "away_goalie": "category",
+    "home_goalie": "category",
+    "away_skaters": "category",
+    "home_skaters": "category",
+    "shot_type": "category",
+    "zone": "category",
+    "reason": "category",
+    "penalty_type": "category",
+    "time": "clock",
+}
+
+# Shift chart clocks; penalty durations in the other tables are plain minutes
+SHIFT_COLUMN_KINDS = {
+    **EVENT_COLUMN_KINDS,
+    "player_id": "int64",
+    "start_time": "clock",
+    "end_time": "clock",
+    "duration": "clock",
+}
+
+# Clock columns are appended as int seconds (None if missing) and come out as
+# an int32 seconds column under these names. MM:SS strings are only made when
+# tables are written, see OUTPUT_CLOCK_COLUMNS.
+CLOCK_SECONDS_COLUMNS = {
+    "time": "seconds_remaining",
+    "start_time": "start_seconds",
+    "end_time": "end_seconds",
+    "duration": "duration_seconds",
+}
+
+# MM:SS columns added to output tables when they are written, each placed
+# just before the seconds column it is made from
+OUTPUT_CLOCK_COLUMNS = {
+    "shot_location_info": {"time": "time_seconds"},
+}
+
+ARRAY_TYPECODES = {"int32": "i", "int64": "q"}
+
+
+class EventColumns:
+    # Column-wise builder for one event table. Rows are appended as the game
+    # index followed by the values of the non-game columns in header order.
+    def __init__(self, header: list, kinds: dict = EVENT_COLUMN_KINDS):
+        self.header = header
+        self.game_columns = [c for c in header if c in GAME_COLUMNS]
+        self.row_columns = [c for c in header if c not in GAME_COLUMNS]
+        self.kinds = kinds
+        self._game_idx = array("i")
+        self._data = {}
+        self._categories = {}
+        self._appenders = []
+        for column in self.row_columns:
+            kind = kinds.get(column, "object")
+            if kind in ARRAY_TYPECODES:
+                self._data[column] = array(ARRAY_TYPECODES[kind])
+                self._appenders.append(self._data[column].append)
+            elif kind == "category":
+                self._data[column] = array("i")
+                self._categories[column] = {}
+                self._appenders.append(
+                    self._category_appender(self._data[column], self._categories[column])
                 )
-            )
-
-        idx = -1
-
-        for play in pbp["plays"]:
-            idx += 1
-            if play["typeDescKey"] in [
-                "period-start",
-                "period-end",
-                "stoppage",
-                "delayed-penalty",
-                "game-end",
-            ]:
-                continue
-
-            event_id = play["eventId"]
-            period = play["periodDescriptor"]["number"]
-            period_type = play["periodDescriptor"]["periodType"]
-            time = play["timeRemaining"]
-
-            away_goalie = play["situationCode"][0]
-            away_skaters = play["situationCode"][1]
-            home_skaters = play["situationCode"][2]
-            home_goalie = play["situationCode"][3]
-
-            if "details" not in play:
-                continue
-
-            event_owner = play["details"]["eventOwnerTeamId"]
-            play_type = play["typeDescKey"]
-
-            zone = play["details"]["zoneCode"]
-            x = play["details"]["xCoord"]
-            y = play["details"]["yCoord"]
-
-            if (idx - 1) == -1:
-                last_play = "Opening"
+            elif kind == "clock":
+                self._data[column] = array("i")
+                self._appenders.append(self._missing_appender(self._data[column]))
+            elif kind == "Int64":
+                self._data[column] = array("q")
+                self._appenders.append(self._missing_appender(self._data[column]))
             else:
-                last_play = pbp["plays"][idx - 1]["typeDescKey"]
-
-            rebound = 0
-            rush = 0
-
-            if idx > 0:
-                time_diff = second_diff(time, pbp["plays"][idx - 1]["timeInPeriod"])
-
-                if (
-                    pbp["plays"][idx - 1]["typeDescKey"] == "blocked-shot"
-                    and time_diff <= 2
-                ):
-                    rebound = 1
-
-                if (
-                    pbp["plays"][idx - 1]["typeDescKey"]
-                    in ["missed-shot", "shot-on-goal"]
-                ) and time_diff <= 3:
-                    rebound = 1
-
-                if (
-                    (pbp["plays"][idx - 1]["typeDescKey"] in ["takeaway", "giveaway"])
-                    and time_diff <= 4
-                    and pbp["plays"][idx - 1]["details"]["zoneCode"] in ["N", "D"]
-                ):
-                    rush = 1
-
-            if "losingPlayerId" in play["details"]:
-                win_player_id = play["details"]["winningPlayerId"]
-                loss_player_id = play["details"]["losingPlayerId"]
-                faceoffs.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        win_player_id,
-                        loss_player_id,
-                        x,
-                        y,
-                        zone,
-                    )
-                )
-            elif "hittingPlayerId" in play["details"]:
-                hitter_id = play["details"]["hittingPlayerId"]
-                hittee_id = play["details"]["hitteePlayerId"]
-                hits.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        hitter_id,
-                        hittee_id,
-                        x,
-                        y,
-                        zone,
-                    )
-                )
-            elif play_type in ["takeaway", "giveaway"]:
-                player_id = play["details"]["playerId"]
-                give_take.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        player_id,
-                        x,
-                        y,
-                        zone,
-                    )
-                )
-            elif play_type == "penalty":
-                penalty_type = play["details"]["descKey"]
-                if "drawnByPlayerId" not in play["details"]:
-                    drawer_id = None
-                else:
-                    drawer_id = play["details"]["drawnByPlayerId"]
-                if "committedByPlayerId" not in play["details"]:
-                    guilty_id = None
-                else:
-                    guilty_id = play["details"]["committedByPlayerId"]
-                duration = play["details"]["duration"]
-                pens.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        penalty_type,
-                        drawer_id,
-                        guilty_id,
-                        duration,
-                        x,
-                        y,
-                        zone,
-                    )
-                )
-            elif play_type == "shot-on-goal":
-                shooter_id = play["details"]["shootingPlayerId"]
-                goalie_id = play["details"]["goalieInNetId"]
-                shot_type = play["details"]["shotType"]
-                shots.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        rebound,
-                        rush,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        shot_type,
-                        shooter_id,
-                        goalie_id,
-                        x,
-                        y,
-                        zone,
-                    )
-                )
-            elif play_type == "missed-shot":
-                shooter_id = play["details"]["shootingPlayerId"]
-                if "goalieInNetId" not in play["details"]:
-                    goalie_id = None
+                self._data[column] = []
+                self._appenders.append(self._data[column].append)
+
+    @staticmethod
+    def _category_appender(codes, categories):
+        def append(value):
+            if value is None:
+                codes.append(-1)
+                return
+            code = categories.get(value)
+            if code is None:
+                code = categories[value] = len(categories)
+            codes.append(code)
+
+        return append
+
+    @staticmethod
+    def _missing_appender(values):
+        # Clocks and IDs are never negative, so -1 marks a missing value
+        def append(value):
+            values.append(-1 if value is None else value)
+
+        return append
+
+    def __len__(self):
+        return len(self._game_idx)
+
+    def append(self, game_idx, *values):
+        self._game_idx.append(game_idx)
+        for append, value in zip(self._appenders, values):
+            append(value)
+
+    def to_frame(self, game_values: dict) -> pd.DataFrame:
+        # game_values maps each game column to its per-game values
+        game_idx = np.frombuffer(self._game_idx, dtype=np.int32)
+        columns = {}
+        for column in self.header:
+            kind = self.kinds.get(column, "object")
+            if column in self.game_columns:
+                values = game_values[column]
+                if kind == "category":
+                    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+                    columns[column] = pd.Categorical.from_codes(codes[game_idx], uniques)
                 else:
-                    goalie_id = play["details"]["goalieInNetId"]
-                shot_type = play["details"]["shotType"]
-                reason = play["details"]["reason"]
-                misses.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        rebound,
-                        rush,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        shot_type,
-                        shooter_id,
-                        goalie_id,
-                        reason,
-                        x,
-                        y,
-                        zone,
-                    )
-                )
-            elif play_type == "goal":
-                shooter_id = play["details"]["scoringPlayerId"]
-                if "goalieInNetId" not in play["details"]:
-                    goalie_id = None
-                else:
-                    goalie_id = play["details"]["goalieInNetId"]
-                if "shotType" not in play["details"]:
-                    shot_type = None
-                else:
-                    shot_type = play["details"]["shotType"]
-
-                primary_assist_id = None
-                secondary_assist_id = None
-
-                if "assist1PlayerTotal" in play["details"]:
-                    primary_assist_id = play["details"]["assist1PlayerId"]
-                    if "assist2PlayerId" in play["details"]:
-                        secondary_assist_id = play["details"]["assist2PlayerId"]
-
-                goals.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        rebound,
-                        rush,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        shot_type,
-                        shooter_id,
-                        goalie_id,
-                        primary_assist_id,
-                        secondary_assist_id,
-                        x,
-                        y,
-                        zone,
-                    )
-                )
-            elif "blocked-shot" == play_type:
-                if "blockingPlayerId" not in play["details"]:
-                    blocked_by_id = None
-                else:
-                    blocked_by_id = play["details"]["blockingPlayerId"]
-                shooter_id = play["details"]["shootingPlayerId"]
-                blocks.append(
-                    (
-                        game,
-                        home_id,
-                        home_team,
-                        away_id,
-                        away_team,
-                        event_owner,
-                        period,
-                        period_type,
-                        time,
-                        event_id,
-                        rebound,
-                        rush,
-                        last_play,
-                        play_type,
-                        away_goalie,
-                        home_goalie,
-                        away_skaters,
-                        home_skaters,
-                        blocked_by_id,
-                        shooter_id,
-                        x,
-                        y,
-                        zone,
-                    )
+                    columns[column] = np.asarray(values, dtype=kind if kind in ARRAY_TYPECODES else object)[game_idx]
+            elif kind in ARRAY_TYPECODES:
+                columns[column] = np.frombuffer(self._data[column], dtype=kind)
+            elif kind == "category":
+                categories = list(self._categories[column])
+                columns[column] = pd.Categorical.from_codes(
+                    np.frombuffer(self._data[column], dtype=np.int32), categories
                 )
+            elif kind == "Int64":
+                values = np.frombuffer(self._data[column], dtype=np.int64)
+                columns[column] = pd.arrays.IntegerArray(values, values < 0)
+            elif kind == "clock":
+                seconds = np.frombuffer(self._data[column], dtype=np.int32)
+                if (seconds < 0).any():
+                    seconds = pd.arrays.IntegerArray(seconds, seconds < 0)
+                columns[CLOCK_SECONDS_COLUMNS[column]] = seconds
             else:
-                continue
+                columns[column] = pd.Series(self._data[column], dtype=object)
+        return pd.DataFrame(columns, columns=list(columns))
+
+
+class PlayEvent(NamedTuple):
+    idx: int
+    event_id: int
+    type_key: str
+    period: int
+    period_type: str
+    period_seconds: int
+    remaining_seconds: int
+    situation_code: str
+    details: Optional[dict]
+    last_play: str
+    rebound: int
+    rush: int
+
+
+def decode_plays(pbp: dict) -> list:
+    # Walk the plays once, attaching the previous-play context (last play,
+    # rebound and rush flags) that every parser needs
+    events = []
+    prev = None
+    prev_seconds = None
+    for idx, play in enumerate(pbp["plays"]):
+        rebound = 0
+        rush = 0
+        period_seconds = time_to_seconds(play["timeInPeriod"])
+
+        if prev is None:
+            last_play = "Opening"
+        else:
+            last_play = prev["typeDescKey"]
+            time_diff = abs(period_seconds - prev_seconds)
+
+            if last_play == "blocked-shot" and time_diff <= 2:
+                rebound = 1
+
+            if last_play in ["missed-shot", "shot-on-goal"] and time_diff <= 3:
+                rebound = 1
+
+            if (
+                last_play in ["takeaway", "giveaway"]
+                and time_diff <= 4
+                and prev.get("details", {}).get("zoneCode") in ["N", "D"]
+            ):
+                rush = 1
+
+        events.append(
+            PlayEvent(
+                idx,
+                play["eventId"],
+                play["typeDescKey"],
+                play["periodDescriptor"]["number"],
+                play["periodDescriptor"]["periodType"],
+                period_seconds,
+                time_to_seconds(play["timeRemaining"]),
+                play.get("situationCode"),
+                play.get("details"),
+                last_play,
+                rebound,
+                rush,
+            )
+        )
+        prev = play
+        prev_seconds = period_seconds
+
+    return events
+
+
+class GamePayload:
+    # Raw API responses for one game, each fetched at most once and shared by
+    # every stage of the pipeline. Responses that were already fetched (e.g.
+    # by the async fetch engine) can be passed in directly, as can a subset of
+    # the decoded events to parse only those plays.
+    def __init__(self, game_id, client=None, play_by_play=None, boxscore=None, shift_chart=None, events=None):
+        self.game_id = game_id
+        self._client = client
+        self._play_by_play = play_by_play
+        self._boxscore = boxscore
+        self._shift_chart = shift_chart
+        self._events = events
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = CachedNHLClient()
+        return self._client
+
+    @property
+    def play_by_play(self):
+        if self._play_by_play is None:
+            self._play_by_play = self.client.game_center.play_by_play(game_id=self.game_id)
+        return self._play_by_play
+
+    @property
+    def boxscore(self):
+        if self._boxscore is None:
+            self._boxscore = self.client.game_center.boxscore(self.game_id)
+        return self._boxscore
+
+    @property
+    def events(self):
+        # Decoded plays, shared by nhl_scraper and shot_scraper2
+        if self._events is None:
+            self._events = decode_plays(self.play_by_play)
+        return self._events
+
+    @property
+    def shift_chart(self):
+        if self._shift_chart is None:
+            self._shift_chart = self.client.game_center.shift_chart_data(game_id=self.game_id)
+        return self._shift_chart
+
+
+def get_payloads(game_ids: list, payloads: dict = None, client=None) -> dict:
+    # Reuse any payloads passed in. When several games are missing, fetch them
+    # concurrently with the async engine; anything it couldn't get falls back
+    # to a lazy fetch on a shared client. A client passed in (e.g. a fake
+    # one) serves every game itself.
+    payloads = dict(payloads) if payloads else {}
+    missing = [game for game in dict.fromkeys(game_ids) if game not in payloads]
+
+    prefetched = {}
+    if len(missing) > 1 and client is None and not event_loop_running():
+        prefetched = AsyncFetchEngine().fetch_games(missing)
+
+    if client is None and any(game not in prefetched for game in missing):
+        client = CachedNHLClient()
+    for game in missing:
+        payloads[game] = GamePayload(game, client, **prefetched.get(game, {}))
+    return payloads
+
+
+def nhl_scraper(
+    game_ids: list,
+    payloads: dict = None,
+    player_registry: PlayerRegistry = None,
+    team_registry: TeamRegistry = None,
+):
+    # Pass registries in to keep player/team state across calls; their
+    # history_frame() has each player's stints with a team
+    payloads = get_payloads(game_ids, payloads)
 
     shots_h = [
         "game",
@@ -782,7 +609,6 @@ def nhl_scraper(game_ids: list):
         "duration",
         "player_id",
     ]
-    players_h = ["player_id", "name", "team", "position"]
     games_h = [
         "game",
         "away_id",
@@ -792,20 +618,441 @@ def nhl_scraper(game_ids: list):
         "winner",
         "loser",
     ]
-    teams_h = ["team_id", "team_abbrev", "city", "name", "conference", "division"]
-
-    shots_df = pd.DataFrame(shots, columns=shots_h)
-    blocks_df = pd.DataFrame(blocks, columns=blocks_h)
-    misses_df = pd.DataFrame(misses, columns=misses_h)
-    goals_df = pd.DataFrame(goals, columns=goals_h)
-    hits_df = pd.DataFrame(hits, columns=hits_h)
-    give_take_df = pd.DataFrame(give_take, columns=give_take_h)
-    faceoffs_df = pd.DataFrame(faceoffs, columns=faceoffs_h)
-    pens_df = pd.DataFrame(pens, columns=pens_h)
-    shifts_df = pd.DataFrame(shifts, columns=shifts_h)
-    players_df = pd.DataFrame(players, columns=players_h)
+
+    shots = EventColumns(shots_h)
+    blocks = EventColumns(blocks_h)
+    misses = EventColumns(misses_h)
+    goals = EventColumns(goals_h)
+    hits = EventColumns(hits_h)
+    give_take = EventColumns(give_take_h)
+    faceoffs = EventColumns(faceoffs_h)
+    pens = EventColumns(pens_h)
+    shifts = EventColumns(shifts_h, SHIFT_COLUMN_KINDS)
+    players = player_registry if player_registry is not None else PlayerRegistry()
+    teams = team_registry if team_registry is not None else TeamRegistry()
+    games = []
+    game_values = {column: [] for column in GAME_COLUMNS}
+
+    conference_dict = {
+        "FLA": "Eastern",
+        "TOR": "Eastern",
+        "TBL": "Eastern",
+        "OTT": "Eastern",
+        "DET": "Eastern",
+        "MTL": "Eastern",
+        "BOS": "Eastern",
+        "BUF": "Eastern",
+        "WSH": "Eastern",
+        "CAR": "Eastern",
+        "NJD": "Eastern",
+        "CBJ": "Eastern",
+        "NYR": "Eastern",
+        "NYI": "Eastern",
+        "PHI": "Eastern",
+        "PIT": "Eastern",
+        "WPG": "Western",
+        "DAL": "Western",
+        "MIN": "Western",
+        "COL": "Western",
+        "STL": "Western",
+        "UTA": "Western",
+        "NSH": "Western",
+        "CHI": "Western",
+        "VGK": "Western",
+        "EDM": "Western",
+        "CGY": "Western",
+        "VAN": "Western",
+        "ANA": "Western",
+        "SEA": "Western",
+        "SJS": "Western",
+        "LAK": "Western",
+    }
+
+    division_dict = {
+        "FLA": "Atlantic",
+        "TOR": "Atlantic",
+        "TBL": "Atlantic",
+        "OTT": "Atlantic",
+        "DET": "Atlantic",
+        "MTL": "Atlantic",
+        "BOS": "Atlantic",
+        "BUF": "Atlantic",
+        "WSH": "Metropolitan",
+        "CAR": "Metropolitan",
+        "NJD": "Metropolitan",
+        "CBJ": "Metropolitan",
+        "NYR": "Metropolitan",
+        "NYI": "Metropolitan",
+        "PHI": "Metropolitan",
+        "PIT": "Metropolitan",
+        "WPG": "Central",
+        "DAL": "Central",
+        "MIN": "Central",
+        "COL": "Central",
+        "STL": "Central",
+        "UTA": "Central",
+        "NSH": "Central",
+        "CHI": "Central",
+        "VGK": "Pacific",
+        "EDM": "Pacific",
+        "CGY": "Pacific",
+        "VAN": "Pacific",
+        "ANA": "Pacific",
+        "SEA": "Pacific",
+        "SJS": "Pacific",
+        "LAK": "Pacific",
+    }
+
+    for game in game_ids:
+        payload = payloads[game]
+        pbp = payload.play_by_play
+
+        team_id_dict = {}
+        home_id = pbp["homeTeam"]["id"]
+        home_team = pbp["homeTeam"]["abbrev"]
+        away_id = pbp["awayTeam"]["id"]
+        away_team = pbp["awayTeam"]["abbrev"]
+        team_id_dict[home_id] = home_team
+        team_id_dict[away_id] = away_team
+        h_city = pbp["homeTeam"]["placeName"]["default"]
+        h_name = pbp["homeTeam"]["commonName"]["default"]
+        h_conference = conference_dict[home_team]
+        h_division = division_dict[home_team]
+        a_city = pbp["awayTeam"]["placeName"]["default"]
+        a_name = pbp["awayTeam"]["commonName"]["default"]
+        a_conference = conference_dict[away_team]
+        a_division = division_dict[away_team]
+
+        game_idx = len(game_values["game"])
+        for column, value in zip(GAME_COLUMNS, [game, home_id, home_team, away_id, away_team]):
+            game_values[column].append(value)
+
+        game_date = pbp.get("gameDate")
+        teams.observe(home_id, home_team, h_city, h_name, h_conference, h_division, game, game_date)
+        teams.observe(away_id, away_team, a_city, a_name, a_conference, a_division, game, game_date)
+
+        box_score = payload.boxscore
+
+        if "score" not in box_score["awayTeam"]:
+            continue
+
+        away_score = box_score["awayTeam"]["score"]
+        home_score = box_score["homeTeam"]["score"]
+        if home_score > away_score:
+            winner = home_id
+            loser = away_id
+        else:
+            winner = away_id
+            loser = home_id
+
+        games.append((game, away_id, away_score, home_id, home_score, winner, loser))
+
+        rosters = {}
+        for guy in pbp["rosterSpots"]:
+            rosters[guy["playerId"]] = {
+                "name": guy["firstName"]["default"] + " " + guy["lastName"]["default"],
+                "position": guy["positionCode"],
+                "jersey": guy["sweaterNumber"],
+                "team": guy["teamId"],
+            }
+
+        shifts_list = payload.shift_chart["data"]
+
+        for player, roster in rosters.items():
+            players.observe(player, roster["name"], roster["team"], roster["position"], game, game_date)
+
+        for shift in shifts_list:
+            start_time = time_to_seconds(shift["startTime"])
+            end_time = time_to_seconds(shift["endTime"])
+            player_id = shift["playerId"]
+            shift_team_id = shift["teamId"]
+            duration = shift["duration"]
+            if duration is not None:
+                duration = time_to_seconds(duration)
+            period = shift["period"]
+            shifts.append(
+                game_idx,
+                shift_team_id,
+                period,
+                start_time,
+                end_time,
+                duration,
+                player_id,
+            )
+
+        for event in payload.events:
+            if event.type_key in [
+                "period-start",
+                "period-end",
+                "stoppage",
+                "delayed-penalty",
+                "game-end",
+            ]:
+                continue
+
+            event_id = event.event_id
+            period = event.period
+            period_type = event.period_type
+            time = event.remaining_seconds
+
+            away_goalie = event.situation_code[0]
+            away_skaters = event.situation_code[1]
+            home_skaters = event.situation_code[2]
+            home_goalie = event.situation_code[3]
+
+            if event.details is None:
+                continue
+
+            details = event.details
+            event_owner = details["eventOwnerTeamId"]
+            play_type = event.type_key
+
+            zone = details["zoneCode"]
+            x = details["xCoord"]
+            y = details["yCoord"]
+
+            last_play = event.last_play
+            rebound = event.rebound
+            rush = event.rush
+
+            if "losingPlayerId" in details:
+                win_player_id = details["winningPlayerId"]
+                loss_player_id = details["losingPlayerId"]
+                faceoffs.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    win_player_id,
+                    loss_player_id,
+                    x,
+                    y,
+                    zone,
+                )
+            elif "hittingPlayerId" in details:
+                hitter_id = details["hittingPlayerId"]
+                hittee_id = details["hitteePlayerId"]
+                hits.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    hitter_id,
+                    hittee_id,
+                    x,
+                    y,
+                    zone,
+                )
+            elif play_type in ["takeaway", "giveaway"]:
+                player_id = details["playerId"]
+                give_take.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    player_id,
+                    x,
+                    y,
+                    zone,
+                )
+            elif play_type == "penalty":
+                penalty_type = details["descKey"]
+                if "drawnByPlayerId" not in details:
+                    drawer_id = None
+                else:
+                    drawer_id = details["drawnByPlayerId"]
+                if "committedByPlayerId" not in details:
+                    guilty_id = None
+                else:
+                    guilty_id = details["committedByPlayerId"]
+                duration = details["duration"]
+                pens.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    penalty_type,
+                    drawer_id,
+                    guilty_id,
+                    duration,
+                    x,
+                    y,
+                    zone,
+                )
+            elif play_type == "shot-on-goal":
+                shooter_id = details["shootingPlayerId"]
+                goalie_id = details["goalieInNetId"]
+                shot_type = details["shotType"]
+                shots.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    rebound,
+                    rush,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    shot_type,
+                    shooter_id,
+                    goalie_id,
+                    x,
+                    y,
+                    zone,
+                )
+            elif play_type == "missed-shot":
+                shooter_id = details["shootingPlayerId"]
+                if "goalieInNetId" not in details:
+                    goalie_id = None
+                else:
+                    goalie_id = details["goalieInNetId"]
+                shot_type = details["shotType"]
+                reason = details["reason"]
+                misses.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    rebound,
+                    rush,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    shot_type,
+                    shooter_id,
+                    goalie_id,
+                    reason,
+                    x,
+                    y,
+                    zone,
+                )
+            elif play_type == "goal":
+                shooter_id = details["scoringPlayerId"]
+                if "goalieInNetId" not in details:
+                    goalie_id = None
+                else:
+                    goalie_id = details["goalieInNetId"]
+                if "shotType" not in details:
+                    shot_type = None
+                else:
+                    shot_type = details["shotType"]
+
+                primary_assist_id = None
+                secondary_assist_id = None
+
+                if "assist1PlayerTotal" in details:
+                    primary_assist_id = details["assist1PlayerId"]
+                    if "assist2PlayerId" in details:
+                        secondary_assist_id = details["assist2PlayerId"]
+
+                goals.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    rebound,
+                    rush,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    shot_type,
+                    shooter_id,
+                    goalie_id,
+                    primary_assist_id,
+                    secondary_assist_id,
+                    x,
+                    y,
+                    zone,
+                )
+            elif "blocked-shot" == play_type:
+                if "blockingPlayerId" not in details:
+                    blocked_by_id = None
+                else:
+                    blocked_by_id = details["blockingPlayerId"]
+                shooter_id = details["shootingPlayerId"]
+                blocks.append(
+                    game_idx,
+                    event_owner,
+                    period,
+                    period_type,
+                    time,
+                    event_id,
+                    rebound,
+                    rush,
+                    last_play,
+                    play_type,
+                    away_goalie,
+                    home_goalie,
+                    away_skaters,
+                    home_skaters,
+                    blocked_by_id,
+                    shooter_id,
+                    x,
+                    y,
+                    zone,
+                )
+            else:
+                continue
+
+    shots_df = shots.to_frame(game_values)
+    blocks_df = blocks.to_frame(game_values)
+    misses_df = misses.to_frame(game_values)
+    goals_df = goals.to_frame(game_values)
+    hits_df = hits.to_frame(game_values)
+    give_take_df = give_take.to_frame(game_values)
+    faceoffs_df = faceoffs.to_frame(game_values)
+    pens_df = pens.to_frame(game_values)
+    shifts_df = shifts.to_frame(game_values)
+    players_df = players.players_frame()
     games_df = pd.DataFrame(games, columns=games_h)
-    teams_df = pd.DataFrame(teams, columns=teams_h)
+    teams_df = teams.teams_frame()
 
     return (
         shots_df,
@@ -823,203 +1070,225 @@ def nhl_scraper(game_ids: list):
     )
 
 
-def shot_scraper2(game_ids: list) -> pd.DataFrame:
-    client = NHLClient()
-    rows = []
+# Names for the tables nhl_scraper returns, in order
+SCRAPER_TABLES = [
+    "shots",
+    "blocks",
+    "misses",
+    "goals",
+    "hits",
+    "give_take",
+    "faceoffs",
+    "penalties",
+    "shifts",
+    "players",
+    "games",
+    "teams",
+]
+
+# Tables with one row per event (or shift, or game) that split by game
+GAME_TABLES = [table for table in SCRAPER_TABLES if table not in ("players", "teams")]
+
+
+def iter_nhl_scraper(
+    game_ids: list,
+    chunk_size: int = 16,
+    client=None,
+    player_registry: PlayerRegistry = None,
+    team_registry: TeamRegistry = None,
+):
+    # Streaming nhl_scraper: yields (chunk_game_ids, {table: df}) for
+    # chunk_size games at a time, with the same typed columns. Each chunk is
+    # fetched and parsed on its own and nothing is kept once it's consumed,
+    # so memory depends on chunk_size rather than on how many games are
+    # requested. players/teams in a batch are the ones seen so far; the
+    # registries hold the deduped totals at the end.
+    game_ids = list(dict.fromkeys(game_ids))
+    if player_registry is None:
+        player_registry = PlayerRegistry()
+    if team_registry is None:
+        team_registry = TeamRegistry()
+
+    for start in range(0, len(game_ids), chunk_size):
+        chunk = game_ids[start:start + chunk_size]
+        payloads = get_payloads(chunk, client=client)
+        tables = nhl_scraper(chunk, payloads, player_registry, team_registry)
+        del payloads
+        yield chunk, dict(zip(SCRAPER_TABLES, tables))
+
+
+def scrape_to_disk(game_ids: list, output_format: str = "parquet", root=None, chunk_size: int = 16, client=None) -> dict:
+    # Stream nhl_scraper's tables for many games straight into a partitioned
+    # dataset, one file per table and game, under DATA_DIR/scraper/<format>.
+    # The deduped players, player-team stints and teams are written once at
+    # the end. Returns the row count per table.
+    writer = get_writer(output_format)
+    if not hasattr(writer, "write_table"):
+        raise ValueError(f"Streaming needs a partitioned format (parquet or arrow), not {output_format!r}")
+    writer.root = root if root is not None else os.path.join(DATA_DIR, "scraper", output_format)
+
+    players = PlayerRegistry()
+    teams = TeamRegistry()
+    rows = dict.fromkeys(SCRAPER_TABLES, 0)
+    for chunk, tables in iter_nhl_scraper(game_ids, chunk_size, client, players, teams):
+        for game_id in chunk:
+            game_tables = {table: tables[table][tables[table]["game"] == game_id] for table in GAME_TABLES}
+            writer.write_game(game_tables, game_id)
+        for table in GAME_TABLES:
+            rows[table] += len(tables[table])
+
+    final_tables = {
+        "players": players.players_frame(),
+        "player_teams": players.history_frame(),
+        "teams": teams.teams_frame(),
+    }
+    os.makedirs(writer.root, exist_ok=True)
+    for table, df in final_tables.items():
+        path = os.path.join(writer.root, f"{table}.{writer.extension}")
+        writer.write_table(to_arrow_table(df), path)
+        rows[table] = len(df)
+    return rows
+
+
+# Unblocked shot attempts the xG model scores
+XG_SHOT_TYPES = ["missed-shot", "goal", "shot-on-goal"]
+
+# Why a shot is left out of the xG input, checked in this order. Empty-net
+# shots are excluded on purpose; the rest are plays missing data.
+SHOT_DROP_REASONS = [
+    "no_owner",
+    "no_situation",
+    "empty_net",
+    "missing_details",
+    "missing_goalie",
+    "missing_shooter",
+]
+
+
+def shot_scraper2(game_ids: list, payloads: dict = None, dropped: dict = None) -> pd.DataFrame:
+    # Shots are pulled out column by column and filtered with explicit masks.
+    # dropped, if given, is updated with {reason: count} for the shots left
+    # out, and any shots dropped for missing data are reported.
+    payloads = get_payloads(game_ids, payloads)
+    detail_keys = [
+        "eventOwnerTeamId",
+        "xCoord",
+        "yCoord",
+        "shotType",
+        "zoneCode",
+        "goalieInNetId",
+        "scoringPlayerId",
+        "shootingPlayerId",
+    ]
+    columns = {name: [] for name in ["game_id", "home_id", "away_id", "situation", "last_play", "rebound", "rush", "shot_class", "period", "time_seconds", *detail_keys]}
+    names = {}
     for game_id in game_ids:
-        game_data = client.game_center.play_by_play(game_id=game_id)
+        payload = payloads[game_id]
+        game_data = payload.play_by_play
         home_id = game_data["homeTeam"]["id"]
         away_id = game_data["awayTeam"]["id"]
-        pbp = game_data["plays"]
 
-        player_dict = {
-            player["playerId"]: player["firstName"]["default"]
-            + " "
-            + player["lastName"]["default"]
-            for player in game_data["rosterSpots"]
+        for player in game_data["rosterSpots"]:
+            names[player["playerId"]] = player["firstName"]["default"] + " " + player["lastName"]["default"]
+
+        shots = [event for event in payload.events if event.type_key in XG_SHOT_TYPES]
+        columns["game_id"] += [game_id] * len(shots)
+        columns["home_id"] += [home_id] * len(shots)
+        columns["away_id"] += [away_id] * len(shots)
+        columns["situation"] += [event.situation_code for event in shots]
+        columns["last_play"] += [event.last_play for event in shots]
+        columns["rebound"] += [event.rebound for event in shots]
+        columns["rush"] += [event.rush for event in shots]
+        columns["shot_class"] += [event.type_key for event in shots]
+        columns["period"] += [event.period for event in shots]
+        columns["time_seconds"] += [event.period_seconds for event in shots]
+        details = [event.details or {} for event in shots]
+        for key in detail_keys:
+            columns[key] += [detail.get(key) for detail in details]
+
+    # Object columns keep ints as ints through the filtering below
+    raw = pd.DataFrame({name: pd.Series(values, dtype=object) for name, values in columns.items()})
+    situation = raw["situation"].where(raw["situation"].str.len() == 4)
+    home = (raw["eventOwnerTeamId"] == raw["home_id"]).to_numpy()
+    goal = (raw["shot_class"] == "goal").to_numpy()
+    shooter_id = raw["scoringPlayerId"].where(goal, raw["shootingPlayerId"])
+    goalie = raw["goalieInNetId"].map(names)
+    shooter = shooter_id.map(names)
+
+    # The defending team's goalie digit: away goalie first, home goalie last
+    defending_goalie = np.where(home, situation.str[0], situation.str[3])
+    masks = {
+        "no_owner": raw["eventOwnerTeamId"].isna().to_numpy(),
+        "no_situation": situation.isna().to_numpy(),
+        "empty_net": defending_goalie == "0",
+        "missing_details": raw[["xCoord", "yCoord", "shotType", "zoneCode"]].isna().any(axis=1).to_numpy(),
+        "missing_goalie": goalie.isna().to_numpy(),
+        "missing_shooter": shooter.isna().to_numpy(),
+    }
+    reason = np.select([masks[name] for name in SHOT_DROP_REASONS], SHOT_DROP_REASONS, default="")
+    keep = reason == ""
+
+    counts = pd.Series(reason[~keep]).value_counts()
+    if dropped is not None:
+        for name, n in counts.items():
+            dropped[name] = dropped.get(name, 0) + int(n)
+    missing = counts.drop("empty_net", errors="ignore")
+    if missing.sum():
+        summary = ", ".join(f"{n} {name}" for name, n in missing.items())
+        print(f"Dropped {missing.sum()} of {len(raw)} shots from the xG input: {summary}")
+
+    df = pd.DataFrame(
+        {
+            "game_id": raw["game_id"],
+            "team_id": raw["home_id"].where(home, raw["away_id"]),
+            "home": pd.Series(home.astype(int), dtype=object),
+            "last_play": raw["last_play"],
+            "rebound": raw["rebound"],
+            "rush": raw["rush"],
+            "home_skaters": situation.str[2],
+            "away_skaters": situation.str[1],
+            "x_coord": raw["xCoord"],
+            "y_coord": raw["yCoord"],
+            "shooter_id": shooter_id,
+            "shooter": shooter,
+            "goalie_id": raw["goalieInNetId"],
+            "goalie": goalie,
+            "shot_type": raw["shotType"],
+            "zone": raw["zoneCode"],
+            "shot_class": raw["shot_class"],
+            "period": raw["period"],
+            "time_seconds": raw["time_seconds"],
         }
+    )
+    df = df[keep].reset_index(drop=True).infer_objects()
+    df["x_coord"] = df["x_coord"].abs()
+    df["time_seconds"] = df["time_seconds"].astype(np.int32)
+    time_df = pd.DataFrame({"period": df["period"], "time_seconds": df["time_seconds"]})
+    return df.drop(["period", "time_seconds"], axis=1), time_df
+
+
+def get_skater_stats(df: pd.DataFrame, max_workers: int = CAREER_STATS_WORKERS, max_calls_per_second: float = CAREER_STATS_RATE, client=None, store: PlayerAttributeStore = None) -> pd.DataFrame:
+
+    # Career attributes come from the local player store; only shooters and
+    # goalies it has never seen are requested, concurrently
+    if store is None:
+        store = PlayerAttributeStore()
+    career_df = store.attributes(
+        pd.concat([df["shooter_id"], df["goalie_id"]]).tolist(),
+        client=client,
+        max_workers=max_workers,
+        max_calls_per_second=max_calls_per_second,
+    )
 
-        for idx, play in enumerate(pbp):
-
-            if play["typeDescKey"] not in ["missed-shot", "goal", "shot-on-goal"]:
-                continue
-
-            home = 0
-            away = 0
-            rebound = 0
-            rush = 0
-            situation = play["situationCode"]
-
-            try:
-                if home_id == play["details"]["eventOwnerTeamId"]:
-                    home = 1
-                else:
-                    away = 1
-
-                if (home == 1 and situation[0] == "0") or (
-                    away == 1 and situation[3] == "0"
-                ):
-                    continue
-
-                if home == 1:
-                    team_id = home_id
-                else:
-                    team_id = away_id
-
-                if idx > 0:
-                    time_diff = second_diff(
-                        play["timeInPeriod"], pbp[idx - 1]["timeInPeriod"]
-                    )
-
-                    if pbp[idx - 1]["typeDescKey"] == "blocked-shot" and time_diff <= 2:
-                        rebound = 1
-
-                    if (
-                        pbp[idx - 1]["typeDescKey"] in ["missed-shot", "shot-on-goal"]
-                    ) and time_diff <= 3:
-                        rebound = 1
-
-                    if (
-                        (pbp[idx - 1]["typeDescKey"] in ["takeaway", "giveaway"])
-                        and time_diff <= 4
-                        and pbp[idx - 1]["details"]["zoneCode"] in ["N", "D"]
-                    ):
-                        rush = 1
-
-                home_skaters = play["situationCode"][2]
-                away_skaters = play["situationCode"][1]
-                shot_class = play["typeDescKey"]
-                x_coord = abs(play["details"]["xCoord"])
-                y_coord = play["details"]["yCoord"]
-                shot_type = play["details"]["shotType"]
-                shooter = None
-                shooter_id = None
-                goalie_id = play["details"]["goalieInNetId"]
-                goalie = player_dict[goalie_id]
-                last_play = pbp[idx - 1]["typeDescKey"]
-                zone = play["details"]["zoneCode"]
-                period = play["periodDescriptor"]["number"]
-                time = play["timeInPeriod"]
-
-                if shot_class == "goal":
-
-                    shooter_id = play["details"]["scoringPlayerId"]
-                    shooter = player_dict[shooter_id]
-
-                else:
+    shooter_stats = career_df.reindex(df["shooter_id"])
+    goalie_stats = career_df.reindex(df["goalie_id"])
 
-                    shooter_id = play["details"]["shootingPlayerId"]
-                    shooter = player_dict[shooter_id]
-
-                rows.append(
-                    [
-                        game_id,
-                        team_id,
-                        home,
-                        last_play,
-                        rebound,
-                        rush,
-                        home_skaters,
-                        away_skaters,
-                        x_coord,
-                        y_coord,
-                        shooter_id,
-                        shooter,
-                        goalie_id,
-                        goalie,
-                        shot_type,
-                        zone,
-                        shot_class,
-                        period,
-                        time,
-                    ]
-                )
-            except:
-                continue
-
-    header = [
-        "game_id",
-        "team_id",
-        "home",
-        "last_play",
-        "rebound",
-        "rush",
-        "home_skaters",
-        "away_skaters",
-        "x_coord",
-        "y_coord",
-        "shooter_id",
-        "shooter",
-        "goalie_id",
-        "goalie",
-        "shot_type",
-        "zone",
-        "shot_class",
-        "period",
-        "time",
-    ]
-    df = pd.DataFrame(rows, columns=header)
-    return df.drop(["period", "time"], axis=1), df[["period", "time"]]
-
-
-def get_skater_stats(df: pd.DataFrame) -> pd.DataFrame:
-
-    client = NHLClient()
-    stats_list = []
-    goalie_stats = []
-    stats_dict = {}
-    goalie_stats_dict = {}
-
-    shooter_ids = df["shooter_id"].tolist()
-    goalie_ids = df["goalie_id"].tolist()
-
-    for id in shooter_ids:
-        if id not in stats_dict.keys():
-            stats = client.stats.player_career_stats(id)
-            try:
-                stats_dict[id] = {
-                    "position": stats["position"],
-                    "hand": stats["shootsCatches"],
-                    "pct": stats["featuredStats"]["regularSeason"]["career"][
-                        "shootingPctg"
-                    ],
-                }
-            except:
-                stats_dict[id] = {
-                    "position": stats["position"],
-                    "hand": stats["shootsCatches"],
-                    "pct": None,
-                }
-
-        position = stats_dict[id]["position"]
-        shooter_hand = stats_dict[id]["hand"]
-        shooting_pct = stats_dict[id]["pct"]
-        stats_list.append((position, shooter_hand, shooting_pct))
-
-    for id in goalie_ids:
-        if id not in goalie_stats_dict.keys():
-            stats = client.stats.player_career_stats(id)
-            try:
-                goalie_stats_dict[id] = {
-                    "hand": stats["shootsCatches"],
-                    "pct": stats["featuredStats"]["regularSeason"]["career"][
-                        "savePctg"
-                    ],
-                }
-            except:
-                goalie_stats_dict[id] = {"hand": stats["shootsCatches"], "pct": None}
-
-        shooter_hand = goalie_stats_dict[id]["hand"]
-        save_pct = goalie_stats_dict[id]["pct"]
-        goalie_stats.append((shooter_hand, save_pct))
-
-    goalie_header = ["glove_hand", "save_pct"]
-    goalie_df = pd.DataFrame(goalie_stats, columns=goalie_header)
-
-    header = ["position", "shooter_hand", "shooting_pct"]
-    stats_df = pd.DataFrame(stats_list, columns=header)
-
-    final_df = pd.concat([df, stats_df, goalie_df], axis=1)
+    final_df = df.copy()
+    final_df["position"] = shooter_stats["position"].to_numpy()
+    final_df["shooter_hand"] = shooter_stats["hand"].to_numpy()
+    final_df["shooting_pct"] = shooter_stats["shooting_pct"].to_numpy()
+    final_df["glove_hand"] = goalie_stats["hand"].to_numpy()
+    final_df["save_pct"] = goalie_stats["save_pct"].to_numpy()
     return final_df
 
 
@@ -1028,44 +1297,29 @@ def angle(x_coord, y_coord):
     return round(np.degrees(np.arctan(y_coord / x_centered)), 2)
 
 
-def get_processed_data(df: pd.DataFrame) -> pd.DataFrame:
+def get_processed_data(df: pd.DataFrame, numeric: bool = False) -> pd.DataFrame:
+    # With numeric=True the home, rebound, rush and situation features stay
+    # integer codes (see FEATURE_LABELS) for predict_xG, and label_features
+    # turns them into the usual strings for output
+    home_skaters = df["home_skaters"].astype(int)
+    away_skaters = df["away_skaters"].astype(int)
+    keep = ((home_skaters >= 3) & (away_skaters >= 3)).to_numpy()
+
+    df = df.drop(["game_id", "team_id", "shooter_id", "shooter", "goalie", "goalie_id"], axis=1)[keep]
+    home_skaters = home_skaters.to_numpy()[keep]
+    away_skaters = away_skaters.to_numpy()[keep]
+    df["home_skaters"] = home_skaters
+    df["away_skaters"] = away_skaters
     df["angle"] = angle(df["x_coord"], df["y_coord"])
     df["shot_on_glove"] = df["shooter_hand"] + df["glove_hand"]
-    df["home_skaters"] = df["home_skaters"].astype(int)
-    df["away_skaters"] = df["away_skaters"].astype(int)
-    df = df[df["home_skaters"] >= 3]
-    df = df[df["away_skaters"] >= 3]
-    df["situation"] = df.apply(
-        lambda row: (
-            "EV"
-            if row["home_skaters"] == row["away_skaters"]
-            else ("PP" if row["home_skaters"] > row["away_skaters"] else "SH")
-        ),
-        axis=1,
-    )
-
-    df = df.drop(
-        ["game_id", "team_id", "shooter_id", "shooter", "goalie", "goalie_id"], axis=1
-    )
+    df["situation"] = np.select(
+        [home_skaters == away_skaters, home_skaters > away_skaters], [0, 1], 2
+    ).astype(np.int8)
     df["target"] = np.where(df["shot_class"] == "goal", 1, 0)
-
-    home_mapping = {}
-    home_mapping[0] = "Away"
-    home_mapping[1] = "Home"
-
-    rebound_mapping = {}
-    rebound_mapping[0] = "No rebound"
-    rebound_mapping[1] = "Rebound"
-
-    rush_mapping = {}
-    rush_mapping[0] = "No rush"
-    rush_mapping[1] = "Rush"
-
-    df["home"] = df["home"].replace(home_mapping)
-    df["rebound"] = df["rebound"].replace(rebound_mapping)
-    df["rush"] = df["rush"].replace(rush_mapping)
-
     df = df.drop("shot_class", axis=1)
+
+    if not numeric:
+        df = label_features(df)
     return df
 
 
@@ -1090,29 +1344,150 @@ def get_on_ice_players(shot_row, shifts_df):
     return pd.Series({"home_players": home_players, "away_players": away_players})
 
 
-def add_skaters_on_ice(
-    processed_df: pd.DataFrame, time_df: pd.DataFrame, shifts_df: pd.DataFrame
-) -> pd.DataFrame:
+def add_shift_seconds(shifts_df: pd.DataFrame) -> pd.DataFrame:
     shifts_copy = shifts_df.copy()
-    final_df = processed_df.copy()
-    final_df[["period", "time"]] = time_df
-    final_df["time_seconds"] = final_df["time"].apply(time_to_seconds)
-    final_df["game_seconds"] = (final_df["period"] - 1) * 1200 + final_df[
-        "time_seconds"
-    ]
-
-    shifts_copy["start_seconds"] = shifts_copy["start_time"].apply(time_to_seconds)
-    shifts_copy["end_seconds"] = shifts_copy["end_time"].apply(time_to_seconds)
+    if "start_seconds" not in shifts_copy:
+        shifts_copy["start_seconds"] = clock_seconds(shifts_copy["start_time"])
+        shifts_copy["end_seconds"] = clock_seconds(shifts_copy["end_time"])
     shifts_copy["start_total_seconds"] = (shifts_copy["period"] - 1) * 1200 + shifts_copy[
         "start_seconds"
     ]
     shifts_copy["end_total_seconds"] = (shifts_copy["period"] - 1) * 1200 + shifts_copy[
         "end_seconds"
     ]
+    return shifts_copy
+
+
+def _players_on_ice(times, starts, ends, player_ids) -> list:
+    # Sort shifts by start so the shifts that can cover each event form a
+    # contiguous window: start in [time - longest shift, time]
+    order = np.argsort(starts, kind="stable")
+    sorted_starts = starts[order]
+    sorted_ends = ends[order]
+    longest = max((sorted_ends - sorted_starts).max(), 0) if len(order) else 0
+
+    lo = np.searchsorted(sorted_starts, times - longest, side="left")
+    hi = np.searchsorted(sorted_starts, times, side="right")
+    counts = np.maximum(hi - lo, 0)
+
+    event_idx = np.repeat(np.arange(len(times)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    shift_idx = np.repeat(lo, counts) + offsets
+
+    keep = sorted_ends[shift_idx] >= times[event_idx]
+    event_idx = event_idx[keep]
+    original_idx = order[shift_idx[keep]]
+
+    # Keep players in their original shift order within each event
+    resort = np.lexsort((original_idx, event_idx))
+    players = player_ids[original_idx[resort]]
+    per_event = np.bincount(event_idx, minlength=len(times))
+    return [chunk.tolist() for chunk in np.split(players, np.cumsum(per_event)[:-1])]
+
+
+def resolve_on_ice_players(game_seconds: pd.Series, shifts_df: pd.DataFrame) -> pd.DataFrame:
+    # Vectorized get_on_ice_players for every event at once. shifts_df needs
+    # the start_total_seconds/end_total_seconds columns from add_shift_seconds.
+    times = game_seconds.to_numpy()
+    home_id = shifts_df["home_id"].iloc[0]
+    away_id = shifts_df["away_id"].iloc[0]
+
+    on_ice = {}
+    for column, team_id in [("home_players", home_id), ("away_players", away_id)]:
+        team_shifts = shifts_df[shifts_df["shift_team"] == team_id]
+        on_ice[column] = _players_on_ice(
+            times,
+            team_shifts["start_total_seconds"].to_numpy(),
+            team_shifts["end_total_seconds"].to_numpy(),
+            team_shifts["player_id"].to_numpy(),
+        )
+
+    return pd.DataFrame(on_ice, index=game_seconds.index)
+
+
+def build_lineup_segments(shifts_df: pd.DataFrame) -> pd.DataFrame:
+    # Split the game into [start, end) ranges of game seconds in which neither
+    # team's on-ice players change. A shift covers both its start and end
+    # second, so the sets can only change at a start or the second after an
+    # end; the players at each of those seconds hold until the next one.
+    shifts_copy = add_shift_seconds(shifts_df).dropna(subset=["start_total_seconds", "end_total_seconds"])
+    if shifts_copy.empty:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in LINEUP_COLUMNS})
+
+    starts = shifts_copy["start_total_seconds"].to_numpy(np.int64)
+    ends = shifts_copy["end_total_seconds"].to_numpy(np.int64)
+    breaks = np.unique(np.concatenate([starts, ends + 1]))
+    on_ice = resolve_on_ice_players(pd.Series(breaks), shifts_copy)
+
+    # A player's next shift starting the second after the last one ended
+    # leaves the sets as they were, so those breaks are merged away
+    home = on_ice["home_players"].tolist()
+    away = on_ice["away_players"].tolist()
+    changed = [i == 0 or home[i] != home[i - 1] or away[i] != away[i - 1] for i in range(len(breaks))]
+    segments = on_ice[changed].reset_index(drop=True)
+    segments.insert(0, "start", breaks[changed])
+    # The last segment starts after every shift has ended and is empty
+    segments.insert(1, "end", np.append(segments["start"].to_numpy()[1:], segments["start"].iloc[-1]))
+    return segments[LINEUP_COLUMNS]
+
+
+def attach_lineups(game_seconds: pd.Series, segments: pd.DataFrame) -> pd.DataFrame:
+    # home_players/away_players for each event, looked up with a single
+    # merge_asof against the lineup segments. Events before the first shift
+    # get empty lists.
+    events = pd.DataFrame(
+        {"game_seconds": game_seconds.to_numpy(np.int64), "row": np.arange(len(game_seconds))}
+    ).sort_values("game_seconds", kind="stable")
+    joined = pd.merge_asof(
+        events,
+        segments[["start", "home_players", "away_players"]].astype({"start": np.int64}),
+        left_on="game_seconds",
+        right_on="start",
+        direction="backward",
+    ).sort_values("row")
+
+    on_ice = {
+        column: [players if isinstance(players, list) else [] for players in joined[column]]
+        for column in ["home_players", "away_players"]
+    }
+    return pd.DataFrame(on_ice, index=game_seconds.index)
 
-    final_df[["home_players", "away_players"]] = final_df.apply(
-        lambda row: get_on_ice_players(row, shifts_copy), axis=1
-    )
+
+def get_lineup_segments(game_id, shifts_df: pd.DataFrame, final: bool = False, store: LineupStore = None) -> pd.DataFrame:
+    # Final games' segments are built once and read back from the lineup
+    # store after that; games in progress are rebuilt every time
+    if store is None:
+        store = LineupStore()
+    if final:
+        segments = store.load(game_id)
+        if segments is not None:
+            return segments
+    segments = build_lineup_segments(shifts_df)
+    if final:
+        store.save(game_id, segments)
+    return segments
+
+
+def add_shot_seconds(processed_df: pd.DataFrame, time_df: pd.DataFrame) -> pd.DataFrame:
+    final_df = processed_df.copy()
+    final_df["period"] = time_df["period"]
+    if "time_seconds" in time_df:
+        final_df["time_seconds"] = time_df["time_seconds"]
+    else:
+        final_df["time_seconds"] = clock_seconds(time_df["time"])
+    final_df["game_seconds"] = (final_df["period"] - 1) * 1200 + final_df[
+        "time_seconds"
+    ]
+    return final_df
+
+
+def add_skaters_on_ice(
+    processed_df: pd.DataFrame, time_df: pd.DataFrame, shifts_df: pd.DataFrame, segments: pd.DataFrame = None
+) -> pd.DataFrame:
+    if segments is None:
+        segments = build_lineup_segments(shifts_df)
+    final_df = add_shot_seconds(processed_df, time_df)
+    final_df[["home_players", "away_players"]] = attach_lineups(final_df["game_seconds"], segments)
 
     return final_df
 
@@ -1130,123 +1505,95 @@ def get_toi_df(shifts_df: pd.DataFrame, players_df: pd.DataFrame, teams_df: pd.D
         lambda tid: "Home" if tid == shifts_df["home_id"].iloc[0] else "Away"
     )
 
-    new_shifts["duration"] = new_shifts["duration"].fillna("00:00")
-    new_shifts["duration"] = new_shifts["duration"].apply(time_to_seconds)
+    if "duration_seconds" in new_shifts:
+        new_shifts["duration"] = new_shifts["duration_seconds"].fillna(0).astype(np.int64)
+    else:
+        new_shifts["duration"] = clock_seconds(new_shifts["duration"].fillna("00:00")).astype(np.int64)
 
     toi_df = new_shifts.groupby(["name", "team_abbr", "position", "period", "is_home"])["duration"].sum().reset_index()
 
-    toi_df["duration_min"] = toi_df["duration"].apply(seconds_to_time)
+    toi_df["duration_min"] = clock_strings(toi_df["duration"]).to_numpy()
 
     return toi_df
 
 def get_attempts_df(
     shots_df: pd.DataFrame, misses_df: pd.DataFrame, blocks_df: pd.DataFrame, goals_df: pd.DataFrame
 ) -> pd.DataFrame:
-    attempts_df = shots_df[["home_skaters", "away_skaters", "event_owner", "period", "time", "play_type", "shooter_id"]]
-    attempts_df = pd.concat([attempts_df, misses_df[["home_skaters", "away_skaters", "event_owner", "period", "time", "play_type", "shooter_id"]]], axis=0)
-    attempts_df = pd.concat([attempts_df, blocks_df[["home_skaters", "away_skaters", "event_owner", "period", "time", "play_type", "shooter_id"]]], axis=0)
-    attempts_df = pd.concat([attempts_df, goals_df[["home_skaters", "away_skaters", "event_owner", "period", "time", "play_type", "shooter_id"]]], axis=0)
-    attempts_df = attempts_df.sort_values(["period", "time"], ascending=[True, False]).reset_index(drop=True)
+    columns = ["home_skaters", "away_skaters", "event_owner", "period", "seconds_remaining", "play_type", "shooter_id"]
+    attempts_df = pd.concat([df[columns] for df in [shots_df, misses_df, blocks_df, goals_df]], axis=0)
+    attempts_df = attempts_df.sort_values(["period", "seconds_remaining"], ascending=[True, False]).reset_index(drop=True)
     return attempts_df
 
-def get_corsi_df(attempts_df: pd.DataFrame, shifts_df: pd.DataFrame) -> pd.DataFrame:
+def add_attempt_seconds(attempts_df: pd.DataFrame) -> pd.DataFrame:
     corsi_df = attempts_df.copy()
-    shifts_copy = shifts_df.copy()
-
-    shifts_copy["start_seconds"] = shifts_copy["start_time"].apply(time_to_seconds)
-    shifts_copy["end_seconds"] = shifts_copy["end_time"].apply(time_to_seconds)
-    shifts_copy["start_total_seconds"] = (shifts_copy["period"] - 1) * 1200 + shifts_copy[
-        "start_seconds"
-    ]
-    shifts_copy["end_total_seconds"] = (shifts_copy["period"] - 1) * 1200 + shifts_copy[
-        "end_seconds"
-    ]
-
-    corsi_df["tr_seconds"] = corsi_df["time"].apply(time_to_seconds)
+    corsi_df["tr_seconds"] = corsi_df["seconds_remaining"]
     corsi_df["time_seconds"] = 1200 - corsi_df["tr_seconds"]
     corsi_df["game_seconds"] = (corsi_df["period"] - 1) * 1200 + corsi_df["time_seconds"]
-    corsi_df[["home_players", "away_players"]] = corsi_df.apply(
-        lambda row: get_on_ice_players(row, shifts_copy), axis=1
-    )
-
     return corsi_df
 
-def tally_xG(full_df: pd.DataFrame, players_df: pd.DataFrame) -> pd.DataFrame:
-    xG_for = defaultdict(float)
-    xG_against = defaultdict(float)
-    player_home_status = {}
-
-    for _, row in full_df.iterrows():
-        xg = row["xG"]
-        is_home_shot = row["home"]
-        period = row["period"]
-
-        if is_home_shot == "Home":
-            shooting_team_players = row['home_players']
-            defending_team_players = row['away_players']
-        else:
-            shooting_team_players = row['away_players']
-            defending_team_players = row['home_players']
+def get_corsi_df(attempts_df: pd.DataFrame, shifts_df: pd.DataFrame, segments: pd.DataFrame = None) -> pd.DataFrame:
+    if segments is None:
+        segments = build_lineup_segments(shifts_df)
+    corsi_df = add_attempt_seconds(attempts_df)
+    corsi_df[["home_players", "away_players"]] = attach_lineups(corsi_df["game_seconds"], segments)
 
-        for pid in shooting_team_players:
-            xG_for[(pid, period)] += xg
-            player_home_status[(pid, period)] = is_home_shot
-
-        for pid in defending_team_players:
-            xG_against[(pid, period)] += xg
+    return corsi_df
 
-            player_home_status[(pid, period)] = "Home" if is_home_shot == "Away" else "Away"
+def explode_on_ice(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    # One row per (event, on-ice player), with side "Home"/"Away" for the
+    # list the player came from
+    parts = []
+    for side, players_col in [("Home", "home_players"), ("Away", "away_players")]:
+        part = df[columns + [players_col]].explode(players_col)
+        part = part[part[players_col].notna()].rename(columns={players_col: "player_id"})
+        part["side"] = side
+        parts.append(part)
 
-    all_keys = set(xG_for.keys()) | set(xG_against.keys())
+    long_df = pd.concat(parts, ignore_index=True)
+    long_df["player_id"] = long_df["player_id"].astype("int64")
+    return long_df
 
-    final_df = pd.DataFrame([
-        {
-            "player_id": pid,
-            "period": period,
-            "xG_for": xG_for.get((pid, period), 0.0),
-            "xG_against": xG_against.get((pid, period), 0.0),
-            "is_home": player_home_status.get((pid, period))
-        }
-        for (pid, period) in all_keys
-    ])
+def tally_xG(full_df: pd.DataFrame, players_df: pd.DataFrame) -> pd.DataFrame:
+    long_df = explode_on_ice(full_df, ["xG", "home", "period"])
+    is_for = (long_df["side"] == long_df["home"]).to_numpy()
+    xg = long_df["xG"].to_numpy(dtype=float)
+
+    grouped = long_df.groupby(["player_id", "period"], sort=False)
+    codes = grouped.ngroup().to_numpy()
+    final_df = grouped["side"].last().reset_index(name="is_home")
+
+    # np.add.at accumulates in row order, so the sums match adding each shot
+    # one at a time
+    xG_for = np.zeros(len(final_df))
+    xG_against = np.zeros(len(final_df))
+    np.add.at(xG_for, codes[is_for], xg[is_for])
+    np.add.at(xG_against, codes[~is_for], xg[~is_for])
+    final_df.insert(2, "xG_for", xG_for)
+    final_df.insert(3, "xG_against", xG_against)
 
     final_df = pd.merge(final_df, players_df, on="player_id", how="left")
     final_df = final_df.sort_values(by=["name", "period"]).reset_index(drop=True)
     return final_df
 
-def tally_corsi(corsi_df, players_df, game_id):
-    client = NHLClient()
+def add_corsi_flags(long_df: pd.DataFrame, home_id) -> pd.DataFrame:
+    # long_df is explode_on_ice output with the event_owner column
+    is_for = (long_df["side"] == "Home") == (long_df["event_owner"] == home_id)
+    long_df["corsi_for"] = is_for.astype(int)
+    long_df["corsi_against"] = (~is_for).astype(int)
+    return long_df
+
+def tally_corsi(corsi_df, players_df, game_id, payload: GamePayload = None):
+    if payload is None:
+        payload = GamePayload(game_id)
 
-    pbp = client.game_center.play_by_play(game_id=game_id)
+    pbp = payload.play_by_play
     home_id = pbp["homeTeam"]["id"]
 
-    corsi_for = defaultdict(int)
-    corsi_against = defaultdict(int)
+    long_df = add_corsi_flags(explode_on_ice(corsi_df, ["event_owner", "period"]), home_id)
 
-    for _, row in corsi_df.iterrows():
-        period = row["period"]
-        if row["event_owner"] == home_id:
-            for player in row["home_players"]:
-                corsi_for[(player, period)] += 1
-            for player in row["away_players"]:
-                corsi_against[(player, period)] += 1
-        else:
-            for player in row["away_players"]:
-                corsi_for[(player, period)] += 1
-            for player in row["home_players"]:
-                corsi_against[(player, period)] += 1
+    data = long_df.groupby(["player_id", "period"], sort=False)[["corsi_for", "corsi_against"]].sum().reset_index()
 
-    all_keys = set(corsi_for.keys()) | set(corsi_against.keys())
-    data = [
-        {
-        "player_id": player,
-        "period": period,
-        "corsi_for": corsi_for.get((player, period), 0),
-        "corsi_against": corsi_against.get((player, period), 0)}
-        for (player, period) in all_keys
-    ]
-
-    return pd.merge(pd.DataFrame(data), players_df, on="player_id", how="left").sort_values(by=["name", "period"], ascending=[True, True]).reset_index(drop=True)
+    return pd.merge(data, players_df, on="player_id", how="left").sort_values(by=["name", "period"], ascending=[True, True]).reset_index(drop=True)
 
 def fill_shot_attempts(attempts_df: pd.DataFrame, players_df: pd.DataFrame) -> pd.DataFrame:
     attempts_by_period = attempts_df.groupby(["period","shooter_id"]).size().reset_index(name="total_attempts")
@@ -1257,184 +1604,86 @@ def fill_shot_attempts(attempts_df: pd.DataFrame, players_df: pd.DataFrame) -> p
     full_attempts["total_attempts"] = full_attempts["total_attempts"].fillna(0).astype(int)
     return pd.merge(full_attempts, players_df, on="player_id", how="left").sort_values(by=["name", "period"], ascending=[True, True]).reset_index(drop=True)
 
-def get_box_score_dfs(game_id, players_df: pd.DataFrame, teams_df: pd.DataFrame) -> pd.DataFrame:
-    client = NHLClient()
-    box_score = client.game_center.boxscore(game_id)
-
-    away_team_info = box_score["awayTeam"]
-    away_team = away_team_info["abbrev"]
-    away_score = away_team_info["score"]
-    away_sog = away_team_info["sog"]
-
-    home_team_info = box_score["homeTeam"]
-    home_team = home_team_info["abbrev"]
-    home_score = home_team_info["score"]
-    home_sog = home_team_info["sog"]
-
-    data = {
-            "team": [away_team, home_team],
-            "score": [away_score, home_score],
-            "sog": [away_sog, home_sog]
-            }
-
-    score_df = pd.DataFrame(data)
-
-    player_stats = box_score["playerByGameStats"]
-
-    away_forward_stats = player_stats["awayTeam"]["forwards"]
-    away_defense_stats = player_stats["awayTeam"]["defense"]
-    away_goalie_stats = player_stats["awayTeam"]["goalies"]
-
-    home_forward_stats = player_stats["homeTeam"]["forwards"]
-    home_defense_stats = player_stats["homeTeam"]["defense"]
-    home_goalie_stats = player_stats["homeTeam"]["goalies"]
-
-    skater_rows = []
-    goalie_rows = []
-
-    for player in away_forward_stats:
-        is_home = "Away"
-        player_id = player["playerId"]
-        goals = player["goals"]
-        assists = player["assists"]
-        points = player["points"]
-        plus_minus = player["plusMinus"]
-        pim = player["pim"]
-        hits = player["hits"]
-        pp_goals = player["powerPlayGoals"]
-        sog = player["sog"]
-        fo_pct = player["faceoffWinningPctg"]
-        blocked_shots = player["blockedShots"]
-        giveaways = player["giveaways"]
-        takeaways = player["takeaways"]
-        skater_rows.append((is_home, player_id, goals, assists, points, plus_minus, pim, hits, pp_goals, sog, fo_pct, blocked_shots, giveaways, takeaways))
-
-    for player in away_defense_stats:
-        is_home = "Away"
-        player_id = player["playerId"]
-        goals = player["goals"]
-        assists = player["assists"]
-        points = player["points"]
-        plus_minus = player["plusMinus"]
-        pim = player["pim"]
-        hits = player["hits"]
-        pp_goals = player["powerPlayGoals"]
-        sog = player["sog"]
-        fo_pct = player["faceoffWinningPctg"]
-        blocked_shots = player["blockedShots"]
-        giveaways = player["giveaways"]
-        takeaways = player["takeaways"]
-        skater_rows.append((is_home, player_id, goals, assists, points, plus_minus, pim, hits, pp_goals, sog, fo_pct, blocked_shots, giveaways, takeaways))
-
-    for player in away_goalie_stats:
-        is_home = "Away"
-        player_id = player["playerId"]
-        ga = player["goalsAgainst"]
-        sa = player["shotsAgainst"]
-        saves = player["saves"]
-        goalie_rows.append((is_home, player_id, ga, sa, saves))
-
-    for player in home_forward_stats:
-        is_home = "Home"
-        player_id = player["playerId"]
-        goals = player["goals"]
-        assists = player["assists"]
-        points = player["points"]
-        plus_minus = player["plusMinus"]
-        pim = player["pim"]
-        hits = player["hits"]
-        pp_goals = player["powerPlayGoals"]
-        sog = player["sog"]
-        fo_pct = player["faceoffWinningPctg"]
-        blocked_shots = player["blockedShots"]
-        giveaways = player["giveaways"]
-        takeaways = player["takeaways"]
-        skater_rows.append((is_home, player_id, goals, assists, points, plus_minus, pim, hits, pp_goals, sog, fo_pct, blocked_shots, giveaways, takeaways))
-
-    for player in home_defense_stats:
-        is_home = "Home"
-        player_id = player["playerId"]
-        goals = player["goals"]
-        assists = player["assists"]
-        points = player["points"]
-        plus_minus = player["plusMinus"]
-        pim = player["pim"]
-        hits = player["hits"]
-        pp_goals = player["powerPlayGoals"]
-        sog = player["sog"]
-        fo_pct = player["faceoffWinningPctg"]
-        blocked_shots = player["blockedShots"]
-        giveaways = player["giveaways"]
-        takeaways = player["takeaways"]
-        skater_rows.append((is_home, player_id, goals, assists, points, plus_minus, pim, hits, pp_goals, sog, fo_pct, blocked_shots, giveaways, takeaways))
-
-    for player in home_goalie_stats:
-        is_home = "Home"
-        player_id = player["playerId"]
-        ga = player["goalsAgainst"]
-        sa = player["shotsAgainst"]
-        saves = player["saves"]
-        goalie_rows.append((is_home, player_id, ga, sa, saves))
-
-    skater_h = ["is_home", "player_id", "goals", "assists", "points", "plus_minus", "pim", "hits", "pp_goals", "sog", "fo_pct", "blocked_shots", "giveaways", "takeaways"]
-    goalie_h = ["is_home", "player_id", "goals_against", "shots_against", "saves"]
-
-    skater_box_score = pd.DataFrame(skater_rows, columns=skater_h)
-    goalie_box_score = pd.DataFrame(goalie_rows, columns=goalie_h)
-
+# Box score fields kept for skaters and goalies, API key -> output column
+SKATER_BOX_FIELDS = {
+    "playerId": "player_id",
+    "goals": "goals",
+    "assists": "assists",
+    "points": "points",
+    "plusMinus": "plus_minus",
+    "pim": "pim",
+    "hits": "hits",
+    "powerPlayGoals": "pp_goals",
+    "sog": "sog",
+    "faceoffWinningPctg": "fo_pct",
+    "blockedShots": "blocked_shots",
+    "giveaways": "giveaways",
+    "takeaways": "takeaways",
+}
+GOALIE_BOX_FIELDS = {
+    "playerId": "player_id",
+    "goalsAgainst": "goals_against",
+    "shotsAgainst": "shots_against",
+    "saves": "saves",
+}
+
+# Boxscore team keys with their is_home label, away team first
+BOX_SIDES = [("awayTeam", "Away"), ("homeTeam", "Home")]
+
+
+def _box_frame(entries: list, fields: dict) -> pd.DataFrame:
+    # entries are (game_id, is_home, player stats) tuples
+    frame = {"game_id": [entry[0] for entry in entries], "is_home": [entry[1] for entry in entries]}
+    for key, column in fields.items():
+        frame[column] = [entry[2][key] for entry in entries]
+    return pd.DataFrame(frame)
+
+
+def flatten_box_scores(box_scores: dict) -> tuple:
+    # One pass over {game_id: boxscore} for every team and player group.
+    # Returns the team, skater and goalie rows with a game_id column, before
+    # any player or team details are joined on.
+    score_rows = []
+    skaters = []
+    goalies = []
+    for game_id, box_score in box_scores.items():
+        player_stats = box_score["playerByGameStats"]
+        for team_key, side in BOX_SIDES:
+            team = box_score[team_key]
+            score_rows.append((game_id, team["abbrev"], team["score"], team["sog"]))
+            team_stats = player_stats[team_key]
+            skaters += [(game_id, side, player) for group in ["forwards", "defense"] for player in team_stats[group]]
+            goalies += [(game_id, side, player) for player in team_stats["goalies"]]
+
+    score_df = pd.DataFrame(score_rows, columns=["game_id", "team", "score", "sog"])
+    skater_box_score = _box_frame(skaters, SKATER_BOX_FIELDS)
+    goalie_box_score = _box_frame(goalies, GOALIE_BOX_FIELDS)
     goalie_box_score["save_pct"] = (goalie_box_score["saves"] / goalie_box_score["shots_against"]).round(3)
-
-    skater_box_score = pd.merge(pd.merge(skater_box_score, players_df, how="left", on="player_id"), teams_df, left_on="team", right_on="team_id", how="left")
-    goalie_box_score = pd.merge(pd.merge(goalie_box_score, players_df, how="left", on="player_id"), teams_df, left_on="team", right_on="team_id", how="left")
-
     return score_df, skater_box_score, goalie_box_score
 
-def copy_to_master_folder(game_id):
-    raw_folder = os.path.join(DATA_DIR, "raw", str(game_id))
-    master_folder = os.path.join(DATA_DIR, "master")
-    os.makedirs(master_folder, exist_ok=True)
-
-    filenames = [
-        "shot_info.csv",
-        "toi_info.csv",
-        "score_info.csv",
-        "skater_box_info.csv",
-        "goalie_box_info.csv",
-        "shot_location_info.csv"
-    ]
 
-    for filename in filenames:
-        src = os.path.join(raw_folder, filename)
-        dst = os.path.join(master_folder, filename)
-        shutil.copy2(src, dst)
-        print(f"Copied {filename} to master folder.")
+def get_box_scores(game_ids: list, players_df: pd.DataFrame, teams_df: pd.DataFrame, payloads: dict = None) -> tuple:
+    # Batch get_box_score_dfs: every game's box scores in one table each,
+    # with a game_id column and a single join against the player and team
+    # details
+    payloads = get_payloads(game_ids, payloads)
+    box_scores = {game_id: payloads[game_id].boxscore for game_id in dict.fromkeys(game_ids)}
+    score_df, skater_box_score, goalie_box_score = flatten_box_scores(box_scores)
 
-def get_and_save_data_for_tableau(game_id):
-    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
-    game_dir = os.path.join(DATA_DIR, str(game_id))
-    os.makedirs(game_dir, exist_ok=True)
-
-    shots_df,blocks_df,misses_df,goals_df,_,_,_,_,shifts_df,players_df,_,teams_df = nhl_scraper([game_id])
-    model = joblib.load(MODELS_DIR / "xgb_v1.pkl")
+    player_details = pd.merge(players_df, teams_df, left_on="team", right_on="team_id", how="left")
+    skater_box_score = pd.merge(skater_box_score, player_details, how="left", on="player_id")
+    goalie_box_score = pd.merge(goalie_box_score, player_details, how="left", on="player_id")
+    return score_df, skater_box_score, goalie_box_score
 
-    temp_df, time_df = shot_scraper2([game_id])
-    temp_df = get_skater_stats(temp_df)
-    processed_df = get_processed_data(temp_df)
 
-    full_shots_df = add_skaters_on_ice(processed_df, time_df, shifts_df)
-    preds = model.predict_proba(full_shots_df.drop(['period', 'time', 'time_seconds', 'game_seconds',
-        'home_players', 'away_players'], axis=1))
-    xG = preds[:,1]
-    full_shots_df["xG"] = xG
+def get_box_score_dfs(game_id, players_df: pd.DataFrame, teams_df: pd.DataFrame, payload: GamePayload = None) -> pd.DataFrame:
+    if payload is None:
+        payload = GamePayload(game_id)
+    tables = get_box_scores([game_id], players_df, teams_df, payloads={game_id: payload})
+    return tuple(df.drop(columns="game_id") for df in tables)
 
-    xG_totals = tally_xG(full_shots_df, players_df)
+def build_shot_info(xG_totals: pd.DataFrame, corsi_totals: pd.DataFrame, full_attempts_df: pd.DataFrame, teams_df: pd.DataFrame) -> pd.DataFrame:
     xG_totals["xGF%"] = xG_totals["xG_for"] / (xG_totals["xG_for"] + xG_totals["xG_against"])
-
-    attempts_df = get_attempts_df(shots_df, misses_df, blocks_df, goals_df)
-    full_attempts_df = fill_shot_attempts(attempts_df, players_df)
-    corsi_df = get_corsi_df(attempts_df=attempts_df, shifts_df=shifts_df)
-    corsi_totals = tally_corsi(corsi_df, players_df, game_id)
-
     corsi_totals["CF%"] = corsi_totals["corsi_for"] / (corsi_totals["corsi_for"] + corsi_totals["corsi_against"])
     xG_corsi_df = pd.merge(xG_totals, corsi_totals, how="outer", on=["name", "period"])
 
@@ -1449,44 +1698,116 @@ def get_and_save_data_for_tableau(game_id):
     final_df["total_attempts"] = final_df["total_attempts"].fillna(0).astype(int)
     final_df = final_df.drop(["player_id", "position_y", "player_id_y", "name_y", "position", "team", "team_y"], axis=1)
     final_df.rename(columns={"player_id_x": "player_id", "name_x": "name", "team_x": "team", "position_x": "position"}, inplace=True)
-    final_df = pd.merge(final_df, teams_df, left_on="team", right_on="team_id").drop("team", axis=1)
-
-    final_df.fillna(0).to_csv(os.path.join(game_dir, f"shot_info.csv"), index=False)
-    print("Saved shot_info.csv!")
-
-    toi_df = get_toi_df(shifts_df=shifts_df, players_df=players_df, teams_df=teams_df)
-    toi_df.to_csv(os.path.join(game_dir, f"toi_info.csv"), index=False)
-    print("Saved toi_info.csv!")
-
-    score_df, skater_box_score, goalie_box_score = get_box_score_dfs(game_id=game_id, players_df=players_df, teams_df=teams_df)
-
-    score_df.to_csv(os.path.join(game_dir, f"score_info.csv"), index=False)
-    print("Saved score_info.csv!")
-
-    skater_box_score.to_csv(os.path.join(game_dir, f"skater_box_info.csv"), index=False)
-    print("Saved skater_box_info.csv!")
-
-    goalie_box_score.to_csv(os.path.join(game_dir, f"goalie_box_info.csv"), index=False)
-    print("Saved goalie_box_info.csv!")
-
-    full_shots_df.to_csv(os.path.join(game_dir, f"shot_location_info.csv"), index=False)
-    print("Saved shot_location_info.csv!")
-
-    # Create folder for this game's CSVs
-    raw_folder = os.path.join(DATA_DIR, "raw", str(game_id))
-    os.makedirs(raw_folder, exist_ok=True)
-
-    # Save all CSVs to raw_folder
-    final_df.fillna(0).to_csv(os.path.join(raw_folder, "shot_info.csv"), index=False)
-    toi_df.to_csv(os.path.join(raw_folder, "toi_info.csv"), index=False)
-    score_df.to_csv(os.path.join(raw_folder, "score_info.csv"), index=False)
-    skater_box_score.to_csv(os.path.join(raw_folder, "skater_box_info.csv"), index=False)
-    goalie_box_score.to_csv(os.path.join(raw_folder, "goalie_box_info.csv"), index=False)
-    full_shots_df.to_csv(os.path.join(raw_folder, "shot_location_info.csv"), index=False)
-
-    print("Saved all raw CSVs!")
-
-    # Copy to master folder for Tableau
-    copy_to_master_folder(game_id)
+    return pd.merge(final_df, teams_df, left_on="team", right_on="team_id").drop("team", axis=1)
+
+def with_clock_strings(tables: dict) -> dict:
+    formatted = {}
+    for table, df in tables.items():
+        for clock_column, seconds_column in OUTPUT_CLOCK_COLUMNS.get(table, {}).items():
+            if seconds_column in df:
+                df = df.copy()
+                seconds = df[seconds_column].fillna(-1).to_numpy(np.int64)
+                df.insert(df.columns.get_loc(seconds_column), clock_column, clock_strings(seconds).to_numpy())
+        formatted[table] = df
+    return formatted
+
+
+def write_tables(tables: dict, game_id, output_formats: tuple = ("csv",), update_master: bool = True, final: bool = True):
+    tables = with_clock_strings(tables)
+    for output_format in output_formats:
+        get_writer(output_format).write_game(tables, game_id, final=final)
+
+    # Add this game to the master tables for Tableau. Batch runs leave this to
+    # the parent process so workers never write the master files at once.
+    # Games still in progress never reach them.
+    if update_master and final and "csv" in output_formats:
+        MasterStore().compact()
+
+def get_and_save_data_for_tableau(game_id, payload: GamePayload = None, model_name: str = DEFAULT_MODEL, output_formats: tuple = ("csv",), update_master: bool = True, live: bool = False, client=None, metrics: PipelineMetrics = None):
+    sys.path.append(os.path.abspath(os.path.join(os.getcwd(), "..")))
+    # Live mode keeps state per game between calls and only processes the
+    # plays and shifts that arrived since the last one
+    if live:
+        from src.live import live_game
+
+        # Each poll fetches its own payload and live games aren't staged
+        if payload is not None or metrics is not None:
+            raise ValueError("payload and metrics can't be used with live=True")
+        return live_game(game_id, model_name, output_formats, client, update_master).poll()
+
+    # Timings, row counts and API/cache counters for each stage below
+    if metrics is None:
+        metrics = PipelineMetrics()
+
+    # Fetch play-by-play, boxscore and shift chart once for every stage below
+    # client (e.g. a fake one for benchmarks) replaces the cached NHL API
+    # client for every request, including player career stats
+    if payload is None:
+        payload = GamePayload(game_id, client)
+    payloads = {game_id: payload}
+    with metrics.stage("fetch", game_id) as stage:
+        stage["rows"] = len(payload.play_by_play["plays"]) + len(payload.shift_chart["data"])
+        payload.boxscore
+
+    with metrics.stage("parse", game_id) as stage:
+        shots_df,blocks_df,misses_df,goals_df,_,_,_,_,shifts_df,players_df,_,teams_df = nhl_scraper([game_id], payloads=payloads)
+        shot_drops = {}
+        temp_df, time_df = shot_scraper2([game_id], payloads=payloads, dropped=shot_drops)
+        stage["rows"] = len(shots_df) + len(blocks_df) + len(misses_df) + len(goals_df) + len(shifts_df)
+        stage["shot_drops"] = shot_drops
+        stage["dropped_shots"] = sum(n for reason, n in shot_drops.items() if reason != "empty_net")
+
+    with metrics.stage("career_stats", game_id) as stage:
+        temp_df = get_skater_stats(temp_df, client=client)
+        stage["rows"] = len(temp_df)
+
+    with metrics.stage("features", game_id) as stage:
+        processed_df = get_processed_data(temp_df, numeric=True)
+        stage["rows"] = len(processed_df)
+
+    with metrics.stage("on_ice", game_id) as stage:
+        final = payload.play_by_play.get("gameState") in FINAL_GAME_STATES
+        segments = get_lineup_segments(game_id, shifts_df, final=final)
+        full_shots_df = add_skaters_on_ice(processed_df, time_df, shifts_df, segments)
+        attempts_df = get_attempts_df(shots_df, misses_df, blocks_df, goals_df)
+        corsi_df = get_corsi_df(attempts_df=attempts_df, shifts_df=shifts_df, segments=segments)
+        stage["rows"] = len(full_shots_df) + len(corsi_df)
+
+    with metrics.stage("scoring", game_id) as stage:
+        full_shots_df["xG"] = predict_xG(full_shots_df, model_name)
+        full_shots_df = label_features(full_shots_df)
+        stage["rows"] = len(full_shots_df)
+
+    with metrics.stage("tallies", game_id) as stage:
+        xG_totals = tally_xG(full_shots_df, players_df)
+        full_attempts_df = fill_shot_attempts(attempts_df, players_df)
+        corsi_totals = tally_corsi(corsi_df, players_df, game_id, payload=payload)
+
+        final_df = build_shot_info(xG_totals, corsi_totals, full_attempts_df, teams_df)
+
+        toi_df = get_toi_df(shifts_df=shifts_df, players_df=players_df, teams_df=teams_df)
+        score_df, skater_box_score, goalie_box_score = get_box_score_dfs(game_id=game_id, players_df=players_df, teams_df=teams_df, payload=payload)
+        stage["rows"] = len(final_df) + len(toi_df) + len(skater_box_score) + len(goalie_box_score)
+
+    tables = {
+        "shot_info": final_df.fillna(0),
+        "toi_info": toi_df,
+        "score_info": score_df,
+        "skater_box_info": skater_box_score,
+        "goalie_box_info": goalie_box_score,
+        "shot_location_info": full_shots_df,
+    }
+    # Final games also store their per-player partials for the season totals
+    if final:
+        from src.aggregates import AggregateStore, game_partials
+
+        with metrics.stage("aggregates", game_id) as stage:
+            partials = game_partials(game_id, payload.play_by_play.get("gameDate"), full_shots_df, corsi_df, shifts_df, players_df)
+            AggregateStore().save_game(game_id, partials)
+            stage["rows"] = len(partials)
+
+    with metrics.stage("write", game_id) as stage:
+        write_tables(tables, game_id, output_formats, update_master, final=final)
+        stage["rows"] = sum(len(df) for df in tables.values())
 
     return final_df, toi_df, score_df, skater_box_score, goalie_box_score, full_shots_df
\ No newline at end of file
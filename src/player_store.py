@@ -0,0 +1,115 @@
+import os
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from src.api_cache import CachedNHLClient, RateLimiter
+from src.config import DATA_DIR, env
+
+# Concurrency limits for player career-stats requests
+CAREER_STATS_WORKERS = 8
+CAREER_STATS_RATE = 10
+
+# Career attributes the xG features need for shooters and goalies
+ATTRIBUTE_COLUMNS = ["position", "hand", "shooting_pct", "save_pct"]
+
+# Stored players older than this are refetched by refresh()
+REFRESH_SECONDS = int(env("NHL_PLAYER_REFRESH_SECONDS", 7 * 24 * 60 * 60))
+
+
+def fetch_career_stats(player_ids, max_workers: int = CAREER_STATS_WORKERS, max_calls_per_second: float = CAREER_STATS_RATE, client=None) -> pd.DataFrame:
+    if client is None:
+        client = CachedNHLClient(rate_limiter=RateLimiter(max_calls_per_second))
+    player_ids = list(dict.fromkeys(player_ids))
+
+    def fetch(player_id):
+        stats = client.stats.player_career_stats(player_id)
+        try:
+            career = stats["featuredStats"]["regularSeason"]["career"]
+        except (KeyError, TypeError):
+            career = {}
+        return (
+            stats["position"],
+            stats["shootsCatches"],
+            career.get("shootingPctg"),
+            career.get("savePctg"),
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(fetch, player_ids))
+
+    return pd.DataFrame(rows, columns=ATTRIBUTE_COLUMNS, index=pd.Index(player_ids, name="player_id"))
+
+
+class PlayerAttributeStore:
+    # Career attributes for every player seen so far, kept in
+    # DATA_DIR/players/attributes.csv with the time each row was fetched.
+    # Games only fetch players the store has never seen; keeping the rest
+    # current is left to refresh(), run in bulk on a schedule.
+    def __init__(self, data_dir=None, max_age: float = REFRESH_SECONDS):
+        if data_dir is None:
+            data_dir = DATA_DIR
+        self.path = os.path.join(data_dir, "players", "attributes.csv")
+        self.max_age = max_age
+        self._frame = None
+
+    def _read(self) -> pd.DataFrame:
+        try:
+            return pd.read_csv(
+                self.path,
+                index_col="player_id",
+                dtype={"position": object, "hand": object},
+                float_precision="round_trip",
+            )
+        except FileNotFoundError:
+            return pd.DataFrame(
+                columns=[*ATTRIBUTE_COLUMNS, "fetched_at"], index=pd.Index([], dtype="int64", name="player_id")
+            )
+
+    def load(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = self._read()
+        return self._frame
+
+    def update(self, attributes: pd.DataFrame):
+        # Merge freshly fetched attributes into what's on disk now, not what
+        # was loaded, so batch workers writing at once can only lose each
+        # other's newest rows (which are then fetched again next time)
+        attributes = attributes.assign(fetched_at=time.time())
+        current = self._read()
+        kept = current[~current.index.isin(attributes.index)]
+        # Skip the empty frame on a first run; concat would warn about its dtypes
+        frame = attributes if kept.empty else pd.concat([kept, attributes])
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        frame.to_csv(tmp_path)
+        os.replace(tmp_path, self.path)
+        self._frame = frame
+
+    def attributes(self, player_ids, client=None, max_workers: int = CAREER_STATS_WORKERS, max_calls_per_second: float = CAREER_STATS_RATE) -> pd.DataFrame:
+        # ATTRIBUTE_COLUMNS for player_ids, fetching only unknown players
+        player_ids = list(dict.fromkeys(player_ids))
+        frame = self.load()
+        missing = [player_id for player_id in player_ids if player_id not in frame.index]
+        if missing:
+            self.update(fetch_career_stats(missing, max_workers, max_calls_per_second, client))
+        return self._frame[ATTRIBUTE_COLUMNS]
+
+    def stale_ids(self, now: float = None) -> list:
+        frame = self.load()
+        now = time.time() if now is None else now
+        return frame.index[frame["fetched_at"] < now - self.max_age].tolist()
+
+    def refresh(self, player_ids=None, force: bool = False, client=None, max_workers: int = CAREER_STATS_WORKERS, max_calls_per_second: float = CAREER_STATS_RATE) -> int:
+        # Refetch stored players older than max_age (every stored player with
+        # force) plus any player_ids not stored yet. Returns how many were
+        # fetched.
+        self._frame = self._read()
+        to_fetch = self._frame.index.tolist() if force else self.stale_ids()
+        if player_ids is not None:
+            to_fetch += [player_id for player_id in player_ids if player_id not in self._frame.index]
+        to_fetch = list(dict.fromkeys(to_fetch))
+        if to_fetch:
+            self.update(fetch_career_stats(to_fetch, max_workers, max_calls_per_second, client))
+        return len(to_fetch)
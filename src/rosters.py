@@ -0,0 +1,110 @@
+import pandas as pd
+
+PLAYER_COLUMNS = ["player_id", "name", "team", "position"]
+TEAM_COLUMNS = ["team_id", "team_abbrev", "city", "name", "conference", "division"]
+PLAYER_TEAM_COLUMNS = [
+    "player_id",
+    "team",
+    "start_date",
+    "end_date",
+    "first_game",
+    "last_game",
+    "games",
+]
+
+
+def effective_key(game_id, game_date) -> tuple:
+    # Order observations by game date, then game ID for games on the same day
+    return (game_date or "", int(game_id))
+
+
+class PlayerRegistry:
+    # Players keyed by player_id. Each player keeps the attributes from the
+    # most recent game they appeared in, and every (player, game) appearance is
+    # kept so trades show up as separate stints in history_frame().
+    def __init__(self):
+        self._players = {}
+        self._seen = set()
+        self._appearances = []
+
+    def __len__(self):
+        return len(self._players)
+
+    def __contains__(self, player_id):
+        return player_id in self._players
+
+    def observe(self, player_id, name, team, position, game_id, game_date=None):
+        if (player_id, game_id) in self._seen:
+            return
+        self._seen.add((player_id, game_id))
+        self._appearances.append((player_id, team, game_date, game_id))
+
+        effective = effective_key(game_id, game_date)
+        current = self._players.get(player_id)
+        if current is None:
+            self._players[player_id] = [effective, name, team, position]
+        elif effective >= current[0]:
+            current[:] = [effective, name, team, position]
+
+    def team_of(self, player_id):
+        return self._players[player_id][2]
+
+    def players_frame(self) -> pd.DataFrame:
+        # One row per player with their latest team, in first-seen order
+        return pd.DataFrame(
+            [(player_id, *values[1:]) for player_id, values in self._players.items()],
+            columns=PLAYER_COLUMNS,
+        )
+
+    def history_frame(self) -> pd.DataFrame:
+        # One row per player stint with a team. A stint ends when the player's
+        # next game (by date) is for a different team.
+        appearances = pd.DataFrame(
+            self._appearances, columns=["player_id", "team", "game_date", "game_id"]
+        )
+        if appearances.empty:
+            return pd.DataFrame(columns=PLAYER_TEAM_COLUMNS)
+
+        appearances["sort_date"] = appearances["game_date"].fillna("")
+        appearances = appearances.sort_values(["player_id", "sort_date", "game_id"], kind="stable")
+        new_stint = (appearances["player_id"] != appearances["player_id"].shift()) | (
+            appearances["team"] != appearances["team"].shift()
+        )
+        appearances["stint"] = new_stint.cumsum()
+
+        history = appearances.groupby("stint", sort=True).agg(
+            player_id=("player_id", "first"),
+            team=("team", "first"),
+            start_date=("game_date", "first"),
+            end_date=("game_date", "last"),
+            first_game=("game_id", "first"),
+            last_game=("game_id", "last"),
+            games=("game_id", "size"),
+        )
+        return history.reset_index(drop=True)[PLAYER_TEAM_COLUMNS]
+
+
+class TeamRegistry:
+    # Teams keyed by team_id, keeping the attributes from the most recent game
+    def __init__(self):
+        self._teams = {}
+
+    def __len__(self):
+        return len(self._teams)
+
+    def __contains__(self, team_id):
+        return team_id in self._teams
+
+    def observe(self, team_id, abbrev, city, name, conference, division, game_id, game_date=None):
+        effective = effective_key(game_id, game_date)
+        current = self._teams.get(team_id)
+        if current is None:
+            self._teams[team_id] = [effective, abbrev, city, name, conference, division]
+        elif effective >= current[0]:
+            current[:] = [effective, abbrev, city, name, conference, division]
+
+    def teams_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [(team_id, *values[1:]) for team_id, values in self._teams.items()],
+            columns=TEAM_COLUMNS,
+        )
@@ -1,13 +1,199 @@
 import os
 import sys
-from .config import DATA_DIR
-from .nhl_scraper import get_and_save_data_for_tableau
+import time
+import argparse
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .config import DATA_DIR, ensure_dirs
+from .nhl_scraper import get_and_save_data_for_tableau, scrape_to_disk
+from .master_store import MasterStore
+from .live import DEFAULT_POLL_SECONDS, LiveGame
+from .metrics import PipelineMetrics
+from .player_store import PlayerAttributeStore
 
-def run_for_game(game_id):
+# Regular season game IDs run from <season start year>020001 up to this count
+REGULAR_SEASON_GAMES = 1312
+
+def run_for_game(game_id, output_formats=("csv",), update_master=True, metrics=None):
     print(f"Processing game {game_id}...")
-    get_and_save_data_for_tableau(game_id)
+    get_and_save_data_for_tableau(game_id, output_formats=output_formats, update_master=update_master, metrics=metrics)
     print(f"Game {game_id} data saved!")
 
+def _run_isolated(game_id, output_formats=("csv",)):
+    # Worker entry point: report failures instead of raising so one bad game
+    # doesn't take down the rest of the batch. Stage metrics go back to the
+    # parent with the result, including those of stages before a failure.
+    start = time.perf_counter()
+    metrics = PipelineMetrics()
+    try:
+        run_for_game(game_id, output_formats, update_master=False, metrics=metrics)
+        return game_id, None, time.perf_counter() - start, metrics.records
+    except Exception as e:
+        return game_id, f"{type(e).__name__}: {e}", time.perf_counter() - start, metrics.records
+
+def _season_start_year(season):
+    # Accept either "2024" or "20242025"
+    return int(str(season)[:4])
+
+def game_ids_for_season(season, team=None):
+    if team is None:
+        start_year = _season_start_year(season)
+        return [int(f"{start_year}02{n:04}") for n in range(1, REGULAR_SEASON_GAMES + 1)]
+
+    from nhlpy import NHLClient
+
+    start_year = _season_start_year(season)
+    schedule = NHLClient().schedule.get_season_schedule(team, f"{start_year}{start_year + 1}")
+    return [game["id"] for game in schedule["games"] if game["gameType"] == 2]
+
+def game_ids_for_dates(start, end, team=None):
+    from nhlpy import NHLClient
+
+    client = NHLClient()
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+
+    game_ids = []
+    day = start_date
+    while day <= end_date:
+        week = client.schedule.get_weekly_schedule(date=day.isoformat())
+        for game_day in week["gameWeek"]:
+            game_date = date.fromisoformat(game_day["date"])
+            if not start_date <= game_date <= end_date:
+                continue
+            for game in game_day["games"]:
+                teams = {game["homeTeam"]["abbrev"], game["awayTeam"]["abbrev"]}
+                if team is None or team in teams:
+                    game_ids.append(game["id"])
+        day += timedelta(days=7)
+
+    return list(dict.fromkeys(game_ids))
+
+def game_ids_from_file(path):
+    with open(path) as f:
+        return [int(line.strip()) for line in f if line.strip() and not line.startswith("#")]
+
+def run_batch(game_ids, workers=None, output_formats=("csv",), force=False, metrics=None):
+    game_ids = list(dict.fromkeys(game_ids))
+    store = MasterStore()
+    if not force:
+        skipped = [game_id for game_id in game_ids if store.is_ingested(game_id)]
+        if skipped:
+            print(f"Skipping {len(skipped)} games already ingested (use --force to redo them)")
+        game_ids = [game_id for game_id in game_ids if game_id not in skipped]
+    total = len(game_ids)
+    failures = {}
+    done = 0
+    batch_start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_isolated, game_id, output_formats) for game_id in game_ids]
+        for future in as_completed(futures):
+            game_id, error, elapsed, records = future.result()
+            if metrics is not None:
+                metrics.extend(records)
+            done += 1
+            status = "ok" if error is None else f"FAILED ({error})"
+            print(f"[{done}/{total}] {game_id} {status} in {elapsed:.1f}s", flush=True)
+            if error is not None:
+                failures[game_id] = error
+
+    print(
+        f"Processed {total - len(failures)}/{total} games in "
+        f"{time.perf_counter() - batch_start:.1f}s"
+    )
+    for game_id, error in failures.items():
+        print(f"  {game_id}: {error}")
+
+    if "csv" in output_formats:
+        if metrics is None:
+            store.compact()
+        else:
+            with metrics.stage("master_compact") as stage:
+                store.compact()
+                stage["rows"] = total - len(failures)
+    return failures
+
+def run_live(game_id, interval=DEFAULT_POLL_SECONDS, output_formats=("csv",)):
+    # Refresh the game's tables every interval seconds until it's final
+    game = LiveGame(game_id, output_formats=output_formats)
+    while True:
+        start = time.perf_counter()
+        game.poll()
+        if game.final:
+            print(f"Game {game_id} is final, live updates done!")
+            return
+        time.sleep(max(interval - (time.perf_counter() - start), 0))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export NHL game data for Tableau.")
+    parser.add_argument("game_ids", nargs="*", type=int, help="NHL game IDs to process")
+    parser.add_argument("--season", help="season to process, e.g. 2024 or 20242025")
+    parser.add_argument("--dates", nargs=2, metavar=("START", "END"), help="date range, YYYY-MM-DD YYYY-MM-DD")
+    parser.add_argument("--team", help="only games for this team abbreviation, e.g. BUF")
+    parser.add_argument("--file", help="file with one game ID per line")
+    parser.add_argument("--format", dest="formats", action="append", choices=["csv", "parquet", "arrow"], help="output format, repeat for several (default: csv)")
+    parser.add_argument("--force", action="store_true", help="reprocess games that are already ingested")
+    parser.add_argument("--rebuild-master", action="store_true", help="rebuild the master tables from the per-game files and exit")
+    parser.add_argument("--refresh-players", action="store_true", help="refetch stale player career attributes in bulk and exit (meant for a nightly schedule; --force refetches all)")
+    parser.add_argument("--aggregate", metavar="SEASON", help="write season-to-date, split and last-N player totals for a season from the stored per-game aggregates and exit")
+    parser.add_argument("--last-n", nargs="+", type=int, default=[5, 10], help="last-N-games totals written by --aggregate (default: 5 10)")
+    parser.add_argument("--events-only", action="store_true", help="stream the parsed play-by-play and shift tables to DATA_DIR/scraper/<format> (parquet or arrow) instead of building reports")
+    parser.add_argument("--chunk-size", type=int, default=16, help="games fetched and parsed at a time with --events-only")
+    parser.add_argument("--live", action="store_true", help="keep refreshing a game in progress until it's final")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_SECONDS, help="seconds between live refreshes")
+    parser.add_argument("--metrics", help="write per-stage timings and counters here, as JSON lines or Prometheus text if it ends in .prom")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args(argv)
+    # --team filters the schedule lookups; it can't narrow explicit game IDs
+    if args.team and not (args.season or args.dates):
+        parser.error("--team needs --season or --dates")
+    return args
+
+def resolve_game_ids(args):
+    game_ids = list(args.game_ids)
+    if args.file:
+        game_ids += game_ids_from_file(args.file)
+    if args.dates:
+        game_ids += game_ids_for_dates(*args.dates, team=args.team)
+    elif args.season:
+        game_ids += game_ids_for_season(args.season, team=args.team)
+    return game_ids
+
 if __name__ == "__main__":
-    game_id = int(input("Enter NHL game ID: ").strip())
-    run_for_game(game_id)
\ No newline at end of file
+    args = parse_args()
+    ensure_dirs()
+    if args.rebuild_master:
+        MasterStore().compact(rebuild=True)
+        sys.exit(0)
+    if args.aggregate:
+        from .aggregates import AggregateStore
+
+        AggregateStore().write_reports(_season_start_year(args.aggregate), last_n=args.last_n)
+        sys.exit(0)
+    if args.refresh_players:
+        refreshed = PlayerAttributeStore().refresh(force=args.force)
+        print(f"Refreshed career attributes for {refreshed} players")
+        sys.exit(0)
+
+    game_ids = resolve_game_ids(args)
+    output_formats = tuple(args.formats or ["csv"])
+    metrics = PipelineMetrics() if args.metrics else None
+    failures = {}
+
+    if args.events_only:
+        rows = scrape_to_disk(game_ids, output_format=(args.formats or ["parquet"])[0], chunk_size=args.chunk_size)
+        print(f"Saved {rows['shots']} shots and {rows['shifts']} shifts from {rows['games']} games")
+    elif args.live:
+        game_id = game_ids[0] if game_ids else int(input("Enter NHL game ID: ").strip())
+        run_live(game_id, args.interval, output_formats)
+    elif not game_ids:
+        game_id = int(input("Enter NHL game ID: ").strip())
+        run_for_game(game_id, output_formats, metrics=metrics)
+    else:
+        failures = run_batch(game_ids, workers=args.workers, output_formats=output_formats, force=args.force, metrics=metrics)
+
+    if metrics is not None:
+        metrics.write(args.metrics)
+        print(f"Saved stage metrics to {args.metrics}")
+    sys.exit(1 if failures else 0)
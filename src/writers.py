@@ -0,0 +1,120 @@
+import os
+import numbers
+import pandas as pd
+
+from src.config import DATA_DIR
+
+def season_for_game(game_id) -> int:
+    # Game IDs start with the year the season began, e.g. 2024021036
+    return int(str(game_id)[:4])
+
+
+class CsvWriter:
+    # The original Tableau layout: DATA_DIR/<game_id> and DATA_DIR/raw/<game_id>.
+    # MasterStore builds DATA_DIR/master from the raw folders, so snapshots of
+    # a game in progress (final=False) only go to DATA_DIR/<game_id>.
+    name = "csv"
+
+    def write_game(self, tables: dict, game_id, final: bool = True):
+        game_dir = os.path.join(DATA_DIR, str(game_id))
+        os.makedirs(game_dir, exist_ok=True)
+        for table, df in tables.items():
+            df.to_csv(os.path.join(game_dir, f"{table}.csv"), index=False)
+            print(f"Saved {table}.csv!")
+        if not final:
+            return
+
+        raw_folder = os.path.join(DATA_DIR, "raw", str(game_id))
+        os.makedirs(raw_folder, exist_ok=True)
+        for table, df in tables.items():
+            df.to_csv(os.path.join(raw_folder, f"{table}.csv"), index=False)
+        print("Saved all raw CSVs!")
+
+
+def to_arrow_table(df: pd.DataFrame):
+    import pyarrow as pa
+
+    # Object columns that mix types (e.g. strings and the 0 from fillna(0))
+    # can't be typed by Arrow, so store their non-null values as strings
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        types = set(values.map(type))
+        if len(types) > 1 and not all(issubclass(t, numbers.Number) for t in types):
+            df[column] = df[column].map(lambda v: v if pd.isna(v) is True else str(v))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class ParquetWriter:
+    # One typed, compressed file per table and game, laid out as a hive
+    # partitioned dataset: DATA_DIR/parquet/<table>/season=<s>/game_id=<g>/
+    # Each table directory is the master table for every game written so far.
+    name = "parquet"
+    extension = "parquet"
+
+    def __init__(self, root=None, compression: str = "zstd"):
+        self.root = root if root is not None else os.path.join(DATA_DIR, self.name)
+        self.compression = compression
+
+    def partition_dir(self, table: str, game_id) -> str:
+        return os.path.join(
+            self.root, table, f"season={season_for_game(game_id)}", f"game_id={game_id}"
+        )
+
+    def write_table(self, arrow_table, path: str):
+        import pyarrow.parquet as pq
+
+        pq.write_table(arrow_table, path, compression=self.compression)
+
+    def write_game(self, tables: dict, game_id, final: bool = True):
+        # A game in progress just has its partitions replaced on every write
+        for table, df in tables.items():
+            folder = self.partition_dir(table, game_id)
+            os.makedirs(folder, exist_ok=True)
+            # Write to a temp name and rename so readers never see a partial file
+            # (dataset readers skip the dot-prefixed temp file)
+            path = os.path.join(folder, f"part-0.{self.extension}")
+            tmp_path = os.path.join(folder, f".part-0.{self.extension}.tmp")
+            self.write_table(to_arrow_table(df), tmp_path)
+            os.replace(tmp_path, path)
+        print(f"Saved {len(tables)} {self.name} tables for game {game_id}!")
+
+
+class ArrowWriter(ParquetWriter):
+    # Same layout as ParquetWriter using the Arrow IPC (Feather v2) format
+    name = "arrow"
+    extension = "arrow"
+
+    def write_table(self, arrow_table, path: str):
+        import pyarrow.feather as feather
+
+        feather.write_feather(arrow_table, path, compression=self.compression)
+
+
+WRITERS = {
+    "csv": CsvWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+}
+
+
+def get_writer(output_format: str):
+    if output_format not in WRITERS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {list(WRITERS)}")
+    return WRITERS[output_format]()
+
+
+def read_master_table(table: str, output_format: str = "parquet", root=None) -> pd.DataFrame:
+    # Every game's rows for one table, with season and game_id columns taken
+    # from the partition directories
+    import pyarrow.dataset as ds
+
+    writer = get_writer(output_format)
+    if root is not None:
+        writer.root = root
+    dataset = ds.dataset(
+        os.path.join(writer.root, table),
+        format="parquet" if output_format == "parquet" else "ipc",
+        partitioning="hive",
+    )
+    return dataset.to_table().to_pandas()
@@ -0,0 +1,128 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+from src.config import MODELS_DIR
+
+DEFAULT_MODEL = "xgb_v1"
+MODEL_NAMES = ["xgb_v1", "xgb_v2"]
+
+# Columns added to the shot frame after feature processing that the model
+# was not trained on
+NON_FEATURE_COLUMNS = [
+    "period",
+    "time_seconds",
+    "game_seconds",
+    "home_players",
+    "away_players",
+]
+
+# Labels the models were trained on for the features get_processed_data can
+# leave as integer codes: code i stands for FEATURE_LABELS[column][i]
+FEATURE_LABELS = {
+    "home": ["Away", "Home"],
+    "rebound": ["No rebound", "Rebound"],
+    "rush": ["No rush", "Rush"],
+    "situation": ["EV", "PP", "SH"],
+}
+
+
+@lru_cache(maxsize=None)
+def load_model(name: str = DEFAULT_MODEL):
+    # Loaded once per process. mmap_mode lets joblib map any numpy arrays
+    # stored alongside the pickle instead of copying them into memory.
+    if name not in MODEL_NAMES:
+        raise ValueError(f"Unknown model {name!r}, expected one of {MODEL_NAMES}")
+    # joblib, and the scikit-learn/xgboost classes in the pickle, are only
+    # imported once a model is actually needed
+    import joblib
+
+    return joblib.load(MODELS_DIR / f"{name}.pkl", mmap_mode="r")
+
+
+def get_model_features(shots_df: pd.DataFrame, model) -> pd.DataFrame:
+    if hasattr(model, "feature_names_in_"):
+        return shots_df[list(model.feature_names_in_)]
+    return shots_df.drop(NON_FEATURE_COLUMNS, axis=1, errors="ignore")
+
+
+def is_coded(values: pd.Series) -> bool:
+    return pd.api.types.is_integer_dtype(values.dtype)
+
+
+def label_features(df: pd.DataFrame) -> pd.DataFrame:
+    # Swap integer-coded features for their string labels
+    df = df.copy()
+    for column, labels in FEATURE_LABELS.items():
+        if column in df and is_coded(df[column]):
+            df[column] = np.array(labels, dtype=object)[df[column].to_numpy()]
+    return df
+
+
+def encode_features(features: pd.DataFrame, model):
+    # The matrix the model's ColumnTransformer would produce (one-hot
+    # categoricals, then the scaled numeric columns), built from integer codes
+    # and pandas categoricals instead of string comparisons. Returns None when
+    # the model isn't laid out that way.
+    transformer = model.steps[0][1]
+    if getattr(transformer, "sparse_output_", True):
+        return None
+
+    blocks = []
+    for name, step, columns in transformer.transformers_:
+        if step == "drop":
+            continue
+        if name != "cat":
+            # The remainder's columns are positions rather than names
+            if all(isinstance(column, (int, np.integer)) for column in columns):
+                subset = features.iloc[:, columns]
+            else:
+                subset = features[columns]
+            blocks.append(subset.to_numpy() if step == "passthrough" else step.transform(subset))
+            continue
+
+        encoder = step.steps[-1][1]
+        if len(step.steps) != 1 or encoder.drop_idx_ is not None:
+            return None
+        for column, categories in zip(columns, encoder.categories_):
+            values = features[column]
+            if column in FEATURE_LABELS and is_coded(values):
+                positions = {label: i for i, label in enumerate(categories)}
+                lookup = np.array([positions.get(label, -1) for label in FEATURE_LABELS[column]])
+                codes = lookup[values.to_numpy()]
+            else:
+                codes = pd.Categorical(values, categories=categories).codes
+            one_hot = np.zeros((len(values), len(categories)), dtype=encoder.dtype)
+            rows = np.flatnonzero(codes >= 0)
+            one_hot[rows, codes[rows]] = 1
+            blocks.append(one_hot)
+
+    return np.hstack(blocks)
+
+
+def predict_xG(shots_df: pd.DataFrame, model_name: str = DEFAULT_MODEL) -> np.ndarray:
+    model = load_model(model_name)
+    features = get_model_features(shots_df, model)
+    if any(column in features and is_coded(features[column]) for column in FEATURE_LABELS):
+        encoded = encode_features(features, model)
+        if encoded is not None:
+            return model[1:].predict_proba(encoded)[:, 1]
+        features = label_features(features)
+    preds = model.predict_proba(features)
+    return preds[:, 1]
+
+
+def score_games(shots_by_game: dict, model_name: str = DEFAULT_MODEL) -> dict:
+    # Score the shots from many games in one predict_proba call and split the
+    # results back out by game_id
+    frames = {game_id: df for game_id, df in shots_by_game.items() if len(df)}
+    scored = {game_id: df.assign(xG=pd.Series(dtype=float)) for game_id, df in shots_by_game.items() if not len(df)}
+    if not frames:
+        return scored
+
+    all_shots = pd.concat(frames, names=["game_id", None])
+    all_shots["xG"] = predict_xG(all_shots, model_name)
+
+    for game_id, game_shots in all_shots.groupby(level="game_id", sort=False):
+        scored[game_id] = game_shots.droplevel("game_id")
+    return {game_id: scored[game_id] for game_id in shots_by_game}
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Outputs, the response cache and the player store go to a scratch
+# directory; this has to be set before anything imports src.config
+os.environ["NHL_DATA_DIR"] = tempfile.mkdtemp(prefix="nhl_tests_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
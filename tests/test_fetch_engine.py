@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+
+from src.api_cache import ResponseCache
+from src.fetch_engine import AsyncFetchEngine
+
+
+def game_response(request: httpx.Request) -> httpx.Response:
+    game_id = int(request.url.path.split("/")[-2]) if "gamecenter" in request.url.path else None
+    if request.url.path.endswith("/play-by-play"):
+        return httpx.Response(200, json={"id": game_id, "gameState": "OFF", "plays": []})
+    if request.url.path.endswith("/boxscore"):
+        return httpx.Response(200, json={"id": game_id, "gameState": "OFF"})
+    return httpx.Response(200, json={"data": [], "total": 0})
+
+
+def make_engine(handler, tmp_path=None, **kwargs) -> AsyncFetchEngine:
+    cache = ResponseCache(str(tmp_path)) if tmp_path is not None else None
+    return AsyncFetchEngine(
+        transport=httpx.MockTransport(handler), cache=cache, use_cache=cache is not None, backoff=0, **kwargs
+    )
+
+
+def test_concurrency_limit():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return game_response(request)
+
+    engine = make_engine(handler, max_concurrency=3)
+    responses = engine.fetch_games(range(2024020001, 2024020011))
+
+    assert len(responses) == 10
+    assert engine.requests_made == 30
+    assert peak == 3
+
+
+def test_retries_5xx_and_429():
+    failures = {}
+
+    def handler(request):
+        # First two requests to each URL fail, with a 503 and then a 429
+        seen = failures.get(request.url.path, 0)
+        failures[request.url.path] = seen + 1
+        if seen == 0:
+            return httpx.Response(503)
+        if seen == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return game_response(request)
+
+    engine = make_engine(handler, retries=2)
+    responses = engine.fetch_games([2024020001])
+
+    assert responses[2024020001]["play_by_play"]["id"] == 2024020001
+    assert engine.requests_made == 9
+
+
+def test_gives_up_after_retries():
+    def handler(request):
+        if request.url.path.endswith("/boxscore"):
+            return httpx.Response(500)
+        return game_response(request)
+
+    engine = make_engine(handler, retries=2)
+    responses = engine.fetch_games([2024020001, 2024020002])
+
+    assert responses == {}
+    # Each game: 3 boxscore attempts plus its play-by-play
+    assert engine.requests_made == 8
+
+
+def test_client_errors_are_not_retried():
+    engine = make_engine(lambda request: httpx.Response(404), retries=3)
+    assert engine.fetch_games([2024020001]) == {}
+    # No retries, so at most the play-by-play and boxscore requests went out
+    assert engine.requests_made <= 2
+
+
+def test_cache_hits_skip_requests(tmp_path):
+    engine = make_engine(game_response, tmp_path)
+    first = engine.fetch_games([2024020001, 2024020002])
+    assert engine.requests_made == 6
+
+    second = engine.fetch_games([2024020001, 2024020002])
+    assert engine.requests_made == 6
+    assert second == first
+    assert engine.cache.hits == 6
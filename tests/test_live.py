@@ -0,0 +1,60 @@
+import copy
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixture_client import SYNTHETIC_FIXTURES_DIR, FixtureClient
+from src.live import LiveGame
+from src.nhl_scraper import get_and_save_data_for_tableau, time_to_seconds
+
+TABLES = ["shot_info", "toi_info", "score_info", "skater_box_info", "goalie_box_info", "shot_location_info"]
+
+
+def game_seconds(period, clock) -> int:
+    return (period - 1) * 1200 + time_to_seconds(clock)
+
+
+class ReplayClient(FixtureClient):
+    # Serves a recorded game as it looked cutoff game seconds in: only the
+    # plays so far, and only the shifts that have ended. cutoff None is the
+    # final game.
+    cutoff = None
+
+    def response(self, game_id, endpoint: str):
+        response = copy.deepcopy(super().response(game_id, endpoint))
+        if self.cutoff is None:
+            return response
+        if endpoint == "play_by_play":
+            response["gameState"] = "LIVE"
+            response["plays"] = [
+                play
+                for play in response["plays"]
+                if game_seconds(play["periodDescriptor"]["number"], play["timeInPeriod"]) <= self.cutoff
+            ]
+        elif endpoint == "shift_chart":
+            response["data"] = [
+                shift for shift in response["data"] if game_seconds(shift["period"], shift["endTime"]) <= self.cutoff
+            ]
+        return response
+
+
+def sorted_frame(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    keys = [column for column in columns if column not in ("home_players", "away_players")][:3]
+    return df[columns].sort_values(keys).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("game_id", [2099030001, 2099030002])
+def test_live_polls_end_equal_to_batch(game_id):
+    client = ReplayClient(SYNTHETIC_FIXTURES_DIR)
+    live = LiveGame(game_id, client=client, update_master=False)
+    for cutoff in [*range(0, 3900, 20), None]:
+        client.cutoff = cutoff
+        live_tables = live.poll()
+    assert live.final
+
+    batch_tables = get_and_save_data_for_tableau(game_id, client=client, update_master=False)
+    for table, live_df, batch_df in zip(TABLES, live_tables, batch_tables):
+        columns = list(batch_df.columns)
+        pd.testing.assert_frame_equal(
+            sorted_frame(live_df, columns), sorted_frame(batch_df, columns), check_dtype=False, obj=table
+        )